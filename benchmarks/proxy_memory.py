@@ -0,0 +1,54 @@
+"""
+Measure the memory held by each Proxy.
+
+Run from the repository root:
+    PYTHONPATH=src python benchmarks/proxy_memory.py
+"""
+import gc
+import sys
+import tracemalloc
+
+import raimad as rai
+
+N = 20000
+
+
+class Empty(rai.Compo):
+    def _make(self):
+        pass
+
+
+def measure(make):
+    """Return bytes allocated per proxy created by `make`."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    proxies = [make() for _ in range(N)]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(
+        stat.size_diff for stat in after.compare_to(before, 'filename')
+        )
+    return (total - sys.getsizeof(proxies)) / N
+
+
+def main():
+    circle = rai.Circle(1)
+    container = Empty()
+
+    def in_container():
+        proxy = circle.proxy().move(1, 2)
+        container.subcompos.append(proxy)
+        return proxy
+
+    def moved():
+        return circle.proxy().move(1, 2)
+
+    print(f'identity        {measure(circle.proxy):6.0f} B')
+    print(f'moved           {measure(moved):6.0f} B')
+    print(f'moved+subcompo  {measure(in_container):6.0f} B')
+
+
+if __name__ == '__main__':
+    main()
@@ -30,20 +30,32 @@ from raimad.iters import (
 from raimad.string_import import string_import
 from raimad.docparse import split_docstring
 
+from raimad import dirty
 from raimad.dictlist import DictList
+from raimad.interning import InternTable, intern_table
+from raimad.storage import Storage, storage, get_storage
+from raimad.packed import PackedPolys, PackedGeoms
 
 from raimad.mark import Mark
 from raimad.layer import Layer
 from raimad.option import Option
 from raimad.boundpoint import BoundPoint
 from raimad.transform import Transform
+from raimad.transform import TransformKind
 from raimad.compo import Compo
 from raimad.compo import MarksContainer
 from raimad.compo import SubcompoContainer
 from raimad.proxy import Proxy
 from raimad.proxy import LMap
 from raimad.partial import Partial
-from raimad.bbox import BBox
+from raimad.memo import CompoCache
+from raimad import bvh
+from raimad import bboxcache
+from raimad import hull
+from raimad import flattener
+from raimad.flattener import flatten_geoms, flatten_instances, iter_geoms
+from raimad.flattener import InstanceTable, GeomsView
+from raimad.bbox import BBox, bboxes
 
 from raimad.rectlw import RectLW
 from raimad.rectwire import RectWire
@@ -79,8 +91,16 @@ from raimad.snowman import Snowman
 __all__ = [
     'export_svg',
     'Transform',
+    'TransformKind',
     'Compo',
     'DictList',
+    'PackedPolys',
+    'PackedGeoms',
+    'Storage',
+    'InternTable',
+    'CompoCache',
+    'InstanceTable',
+    'GeomsView',
     'Proxy',
     'BoundPoint',
     'MarksContainer',
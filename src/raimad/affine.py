@@ -2,6 +2,9 @@
 Operations on affine matrices
 """
 
+from typing import Callable
+import math
+
 import numpy as np
 import numpy.typing as _
 
@@ -66,30 +69,283 @@ def get_rotation(matrix: 'rai.typing.Affine') -> float:
     """
     return float(np.arctan2(matrix[1, 0], matrix[0, 0]))
 
+class Workspace:
+    """
+    Scratch buffers for the affine kernels.
+
+    Kernels that need temporary arrays take them from a Workspace.
+    Passing the same Workspace to many calls
+    reuses the same memory instead of allocating
+    fresh temporaries for every polygon.
+    A Workspace must not be shared between threads.
+    """
+    _buffers: dict[tuple['np.typing.DTypeLike', int], np.ndarray]
+
+    def __init__(self) -> None:
+        self._buffers = {}
+
+    def get(
+            self,
+            shape: int | tuple[int, ...],
+            dtype: 'np.typing.DTypeLike',
+            slot: int = 0,
+            ) -> np.ndarray:
+        """
+        Get a scratch array.
+        Arrays from different slots don't overlap.
+        The contents are undefined.
+        """
+        size = shape if isinstance(shape, int) else math.prod(shape)
+        key = (dtype, slot)
+        buffer = self._buffers.get(key)
+        if buffer is None or len(buffer) < size:
+            capacity = max(size, 2 * len(buffer) if buffer is not None else 0)
+            buffer = np.empty(capacity, dtype=dtype)
+            self._buffers[key] = buffer
+        if isinstance(shape, int):
+            return buffer[:size]
+        return buffer[:size].reshape(shape)
+
+# The kernels below work on blocks of this many vertices,
+# one column at a time, through scratch columns small enough
+# to stay in cache.
+# numpy is much faster at that than at broadcasting
+# an N x 2 array against a length-2 row.
+BLOCK = 8192
+# Below this many vertices, the bookkeeping costs more than
+# the temporaries, so the kernels just use numpy expressions,
+# unless they were given an `out` or a workspace to use instead.
+SMALL = 256
+
+def _blockwise(
+        xyarray: np.ndarray,
+        out: np.ndarray | None,
+        workspace: Workspace | None,
+        fill: 'Callable[..., None]',
+        ) -> np.ndarray:
+    """
+    Run a kernel block by block.
+    `fill(x, y, new_x, new_y, scratch)` computes the new columns of a block
+    into `new_x` and `new_y`.
+    Those are the columns of `out` itself, unless `out` overlaps
+    `xyarray` (e.g. it is `xyarray` itself). Then they are scratch
+    columns that are copied to `out` once the block has been read.
+    """
+    if out is None:
+        out = np.empty_like(xyarray)
+        overlaps = False
+    else:
+        overlaps = np.may_share_memory(out, xyarray)
+    workspace = workspace or Workspace()
+
+    if not overlaps and len(xyarray) <= BLOCK:
+        scratch = workspace.get(len(xyarray), xyarray.dtype, 2)
+        fill(xyarray[:, 0], xyarray[:, 1], out[:, 0], out[:, 1], scratch)
+        return out
+
+    for start in range(0, len(xyarray), BLOCK):
+        block = xyarray[start:start + BLOCK]
+        length = len(block)
+        scratch = workspace.get(length, xyarray.dtype, 2)
+        if not overlaps:
+            target = out[start:start + length]
+            fill(block[:, 0], block[:, 1], target[:, 0], target[:, 1], scratch)
+            continue
+
+        new_x = workspace.get(length, xyarray.dtype, 0)
+        new_y = workspace.get(length, xyarray.dtype, 1)
+        fill(block[:, 0], block[:, 1], new_x, new_y, scratch)
+        out[start:start + length, 0] = new_x
+        out[start:start + length, 1] = new_y
+
+    return out
+
 def transform_xyarray(
         matrix: 'rai.typing.Affine',
-        xyarray: 'rai.typing.Poly | pc.typing.PolyArray'
+        xyarray: 'rai.typing.Poly | pc.typing.PolyArray',
+        out: np.ndarray | None = None,
+        workspace: Workspace | None = None,
         ) -> 'rai.typing.Poly | pc.typing.PolyArray':
     """
-    Apply transformation to xyarray and return new transformed xyarray
+    Apply transformation to xyarray and return new transformed xyarray.
+    Single-precision xyarrays are transformed in single precision,
+    everything else in double precision.
+
+    The last row of a 2D affine matrix is always [0, 0, 1],
+    so this applies the 2x2 linear part and the offset directly,
+    without going through homogeneous coordinates.
+    If `out` is given, the result is written there
+    (`out` may be `xyarray` itself).
+    Temporaries come from `workspace` if given.
     """
     if len(xyarray) == 0:
-        return xyarray
+        return xyarray if out is None else out
 
-    if not isinstance(xyarray, np.ndarray):
-        # TODO instead of dynamic hacks like this,
-        # grind through with a static checker
-        xyarray = np.array(xyarray)
+    (xx, xy, dx), (yx, yy, dy) = matrix[:2].tolist()
+    return general_xyarray(
+        as_xyarray(xyarray),
+        xx, xy, yx, yy, dx, dy,
+        out=out,
+        workspace=workspace,
+        )
 
-    homogeneous = np.hstack((
-        xyarray,
-        np.ones((xyarray.shape[0], 1)),
-        ))
-    transformed = np.dot(homogeneous, matrix.T)
-    euclidean: np.typing.NDArray[np.float64] = \
-        transformed[:, :2] / transformed[:, 2].reshape(-1, 1)
+def general_xyarray(
+        xyarray: np.typing.NDArray,
+        xx: float,
+        xy: float,
+        yx: float,
+        yy: float,
+        dx: float,
+        dy: float,
+        out: np.ndarray | None = None,
+        workspace: Workspace | None = None,
+        ) -> np.typing.NDArray:
+    """
+    Apply the affine transformation
+    x' = xx * x + xy * y + dx, y' = yx * x + yy * y + dy
+    to xyarray and return new transformed xyarray.
+    The result has the same dtype as `xyarray`.
+    If `out` is given, the result is written there
+    (`out` may be `xyarray` itself).
+    Temporaries come from `workspace` if given.
+    """
+    if len(xyarray) <= SMALL and out is None and workspace is None:
+        x = xyarray[:, 0]
+        y = xyarray[:, 1]
+        out = np.empty_like(xyarray)
+        out[:, 0] = x * xx + y * xy + dx
+        out[:, 1] = x * yx + y * yy + dy
+        return out
+
+    def fill(x, y, new_x, new_y, scratch):
+        np.multiply(x, xx, out=new_x)
+        np.multiply(y, xy, out=scratch)
+        np.add(new_x, scratch, out=new_x)
+        np.add(new_x, dx, out=new_x)
+
+        np.multiply(x, yx, out=new_y)
+        np.multiply(y, yy, out=scratch)
+        np.add(new_y, scratch, out=new_y)
+        np.add(new_y, dy, out=new_y)
+
+    return _blockwise(xyarray, out, workspace, fill)
+
+def as_xyarray(
+        xyarray: 'rai.typing.Poly | pc.typing.PolyArray'
+        ) -> 'rai.typing.PolyArray':
+    """
+    Convert xyarray to a float array.
+    Single-precision xyarrays stay single-precision,
+    everything else becomes double precision.
+    """
+    array = np.asarray(xyarray)
+    dtype = array.dtype if array.dtype == np.float32 else np.float64
+    return array.astype(dtype, copy=False)
+
+def translate_xyarray(
+        xyarray: np.typing.NDArray,
+        dx: float,
+        dy: float,
+        out: np.ndarray | None = None,
+        workspace: Workspace | None = None,
+        ) -> np.typing.NDArray:
+    """
+    Translate xyarray and return new translated xyarray.
+    The result has the same dtype as `xyarray`.
+    If `out` is given, the result is written there
+    (`out` may be `xyarray` itself).
+    Temporaries come from `workspace` if given.
+    """
+    if len(xyarray) <= SMALL:
+        return np.add(
+            xyarray,
+            np.array((dx, dy), dtype=xyarray.dtype),
+            out=out,
+            )
+
+    def fill(x, y, new_x, new_y, scratch):
+        np.add(x, dx, out=new_x)
+        np.add(y, dy, out=new_y)
+
+    return _blockwise(xyarray, out, workspace, fill)
+
+def manhattan_xyarray(
+        xyarray: np.typing.NDArray,
+        xx: float,
+        xy: float,
+        yx: float,
+        yy: float,
+        dx: float,
+        dy: float,
+        out: np.ndarray | None = None,
+        workspace: Workspace | None = None,
+        ) -> np.typing.NDArray:
+    """
+    Apply an affine transformation whose linear part
+    has only two nonzero coefficients,
+    either on the diagonal (xx, yy) or on the antidiagonal (xy, yx).
+    Each output axis is then a scaled copy of one input axis,
+    so no matrix product is needed.
+    The result has the same dtype as `xyarray`.
+    If `out` is given, the result is written there
+    (`out` may be `xyarray` itself).
+    Temporaries come from `workspace` if given.
+    """
+    if len(xyarray) <= SMALL and out is None and workspace is None:
+        x = xyarray[:, 0]
+        y = xyarray[:, 1]
+        out = np.empty_like(xyarray)
+        if xy == 0 and yx == 0:
+            out[:, 0] = x * xx + dx
+            out[:, 1] = y * yy + dy
+        else:
+            out[:, 0] = y * xy + dx
+            out[:, 1] = x * yx + dy
+        return out
+
+    if xy == 0 and yx == 0:
+        def fill(x, y, new_x, new_y, scratch):
+            np.multiply(x, xx, out=new_x)
+            np.add(new_x, dx, out=new_x)
+            np.multiply(y, yy, out=new_y)
+            np.add(new_y, dy, out=new_y)
+    else:
+        def fill(x, y, new_x, new_y, scratch):
+            np.multiply(y, xy, out=new_x)
+            np.add(new_x, dx, out=new_x)
+            np.multiply(x, yx, out=new_y)
+            np.add(new_y, dy, out=new_y)
+
+    return _blockwise(xyarray, out, workspace, fill)
+
+def transform_stack(
+        matrices: np.typing.NDArray[np.float64],
+        xyarray: 'rai.typing.Poly | pc.typing.PolyArray',
+        out: np.ndarray | None = None,
+        ) -> np.ndarray:
+    """
+    Apply each of a stack of N affine matrices (an N x 3 x 3 array)
+    to the same xyarray of V points,
+    and return all N transformed copies as one N x V x 2 array.
+    This is done in one go by broadcasting,
+    so placing the same geometry many times
+    doesn't cost a separate call for each placement.
+    If `out` is given, the result is written there.
+    """
+    xyarray = as_xyarray(xyarray)
+    matrices = np.asarray(matrices).astype(xyarray.dtype, copy=False)
+    if out is None:
+        out = np.empty((len(matrices), len(xyarray), 2), dtype=xyarray.dtype)
+
+    x = xyarray[np.newaxis, :, 0]
+    y = xyarray[np.newaxis, :, 1]
+    xx, xy, dx = (matrices[:, 0, column, np.newaxis] for column in range(3))
+    yx, yy, dy = (matrices[:, 1, column, np.newaxis] for column in range(3))
 
-    return euclidean
+    # Same order of operations as the single-matrix kernels
+    np.add(x * xx + y * xy, dx, out=out[..., 0])
+    np.add(x * yx + y * yy, dy, out=out[..., 1])
+    return out
 
 def transform_point(
         matrix: 'rai.typing.Affine',
@@ -1,6 +1,6 @@
 """BBox.py: contains BBox class and relevant Exceptions."""
 
-from typing import List
+from typing import Iterable, List
 
 try:
     from typing import Self
@@ -28,6 +28,7 @@ class EmptyBBoxError(Exception):
 class BBox(object):
     """
     """
+    __slots__ = ('max_x', 'max_y', 'min_x', 'min_y', '_proxy')
 
     max_x: float
     max_y: float
@@ -67,9 +68,31 @@ class BBox(object):
         """Return as list of [min_x, min_y, max_x, max_y]."""
         return [self.min_x, self.min_y, self.max_x, self.max_y]
 
-    def __array__(self) -> np.ndarray:
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
         """Return as numpy array of [min_x, min_y, max_x, max_y]."""
-        return np.array(self.as_list())
+        return np.array(self.as_list(), dtype=dtype)
+
+    @classmethod
+    def from_bounds(
+            cls,
+            bounds: 'Iterable[float]',
+            proxy=None,
+            ) -> Self:
+        """
+        Create a new BBox from [min_x, min_y, max_x, max_y].
+        [inf, inf, -inf, -inf] makes an empty bbox.
+
+        Parameters
+        ----------
+        bounds: Iterable[float]
+            [min_x, min_y, max_x, max_y]
+        proxy: rai.Proxy | None
+            The proxy that this bbox should be bound to.
+            This is optional.
+        """
+        bbox = cls(proxy=proxy)
+        bbox.min_x, bbox.min_y, bbox.max_x, bbox.max_y = map(float, bounds)
+        return bbox
 
     def __iter__(self):
         """Return as iter of [min_x, min_y, max_x, max_y]."""
@@ -142,8 +165,17 @@ class BBox(object):
         xyarray: np.ndarray
             A N x 2 numpy array containing points to add to the bbox.
         """
-        for point in xyarray:
-            self.add_point(point)
+        xyarray = np.asarray(xyarray, dtype=np.float64)
+        if not xyarray.size:
+            return
+
+        # Reducing each column separately is much faster than axis=0
+        xs = xyarray[:, 0]
+        ys = xyarray[:, 1]
+        self.min_x = min(self.min_x, float(xs.min()))
+        self.min_y = min(self.min_y, float(ys.min()))
+        self.max_x = max(self.max_x, float(xs.max()))
+        self.max_y = max(self.max_y, float(ys.max()))
 
     def add_point(self, point):
         """
@@ -609,5 +641,36 @@ class BBox(object):
 
         return new
 
-
-
+def bboxes(
+        items: (
+            'Iterable[rai.typing.Compo | rai.PackedPolys | rai.typing.Poly]'
+            ),
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Get the bboxes of many things at once.
+
+    Parameters
+    ----------
+    items: Iterable
+        Compos, proxies, PackedPolys or N x 2 arrays of points.
+        Compos and proxies use their cached bboxes (see bboxcache.py).
+        For the bbox of every polygon in a PackedPolys,
+        use `PackedPolys.bboxes()` instead.
+
+    Returns
+    -------
+    np.ndarray
+        N x 4 array with [min_x, min_y, max_x, max_y] for every item.
+        Empty items get [inf, inf, -inf, -inf].
+    """
+    bounds = []
+    for item in items:
+        if isinstance(item, rai.Proxy):
+            bounds.append(rai.bboxcache.proxy_bounds(item))
+        elif isinstance(item, rai.Compo):
+            bounds.append(rai.bboxcache.compo_bounds(item))
+        elif isinstance(item, rai.PackedPolys):
+            bounds.append(BBox(item.vertices).as_list())
+        else:
+            bounds.append(BBox(item).as_list())
+    return np.array(bounds, dtype=np.float64).reshape(-1, 4)
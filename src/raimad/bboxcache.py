@@ -0,0 +1,175 @@
+"""
+bboxcache.py
+Cached bounding boxes of compo hierarchies.
+
+Every real compo keeps the exact bounding box of its hierarchy
+(in its own coordinates), computed from its own geometry
+and the cached bounding boxes of its subcompos.
+A subcompo placed with a Manhattan transform
+(or a plain translation) contributes the box around the transformed
+corners of the bounding box of its compo, which is exact.
+A subcompo placed with any other transform
+contributes the bounding box of the transformed convex hull
+of its compo (see hull.py), which is also exact.
+
+The cache of a compo is checked against its `_version`,
+which changes whenever anything in its hierarchy does (see dirty.py),
+so only the compos that something changed under are recomputed.
+"""
+
+from typing import Callable, Iterable
+
+import numpy as np
+
+import raimad as rai
+
+class _Entry:
+    """
+    Cached value (bounds, hull, ...) of a compo,
+    with the `_version` of the compo it was computed at.
+    """
+    __slots__ = ('version', 'value')
+
+    def __init__(
+            self,
+            version: int,
+            value: np.typing.NDArray[np.float64],
+            ) -> None:
+        self.version = version
+        self.value = value
+
+def _vertex_bounds(
+        geoms: 'Iterable[tuple[str, rai.PackedPolys]]',
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Get the bounds of the vertices in some (layer, polys) pairs.
+    """
+    bbox = rai.BBox()
+    for _, polys in geoms:
+        bbox.add_xyarray(polys.vertices)
+    return np.array(bbox.as_list())
+
+def _hull_bounds(
+        transform: 'rai.typing.Transform',
+        hull: np.typing.NDArray[np.float64],
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Get the bounds of a transformed convex hull.
+    """
+    return np.array(rai.BBox(transform.transform_xyarray(hull)).as_list())
+
+def _entry(
+        compo: 'rai.typing.RealCompo',
+        attr: str = '_bbox_entry',
+        compute: 'Callable[[rai.typing.RealCompo, dict], np.ndarray] | None'
+            = None,
+        ) -> _Entry:
+    """
+    Get the up-to-date cache entry of a real compo.
+
+    The entry is kept in the `attr` attribute of every compo,
+    and its value is computed with `compute(compo, entries)`
+    from the compo and the entries of its subcompos.
+    This defaults to the bounds of the compo.
+    """
+    if compute is None:
+        compute = _compute
+
+    # Post-order through the compos, without recursion.
+    # Subcompos are only visited if their parent changed.
+    entries: dict = {}
+    stack = [compo]
+    while stack:
+        current = stack[-1]
+        if id(current) in entries:
+            stack.pop()
+            continue
+
+        entry = getattr(current, attr)
+        if entry is None or entry.version != current._version:
+            pending = []
+            for proxy in current.subcompos.values():
+                child = proxy.final()
+                if id(child) not in entries:
+                    pending.append(child)
+            if pending:
+                stack.extend(pending)
+                continue
+
+            entry = _Entry(current._version, compute(current, entries))
+            setattr(current, attr, entry)
+
+        # Keep the compo itself in the dict, so its id can't be reused
+        entries[id(current)] = (current, entry)
+        stack.pop()
+
+    return entries[id(compo)][1]
+
+def _compute(
+        compo: 'rai.typing.RealCompo',
+        entries: dict,
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Compute the bounds of a compo
+    from its geometry and the entries of its subcompos.
+    """
+    boxes = [_vertex_bounds(compo.geoms.items())[np.newaxis]]
+    placed = []
+    for proxy in compo.subcompos.values():
+        child, transform, _ = rai.flattener._enter(proxy, None, None)
+        if transform.kind is rai.TransformKind.GENERAL:
+            hull = rai.hull.compo_hull(child)
+            boxes.append(_hull_bounds(transform, hull)[np.newaxis])
+        else:
+            placed.append((transform, entries[id(child)][1].value))
+
+    if placed:
+        # Transform the boxes of all the other subcompos at once
+        boxes.append(rai.bvh.transform_boxes(
+            rai.Transform.stack(transform for transform, _ in placed),
+            np.array([bounds for _, bounds in placed]),
+            ))
+
+    boxes = np.concatenate(boxes)
+    return np.concatenate((
+        boxes[:, :2].min(axis=0),
+        boxes[:, 2:].max(axis=0),
+        ))
+
+def compo_bounds(
+        compo: 'rai.typing.RealCompo',
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Get the exact [min_x, min_y, max_x, max_y] of everything
+    in the hierarchy of a real compo.
+    Don't modify the returned array, it's the cached one.
+    """
+    return _entry(compo).value
+
+def proxy_bounds(
+        proxy: 'rai.typing.Proxy',
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Get the exact [min_x, min_y, max_x, max_y] of everything
+    in the hierarchy of a proxy.
+    Don't modify the returned array, it's the cached one.
+    """
+    flat = proxy._flat()
+    transform = flat[1]
+    general = transform.kind is rai.TransformKind.GENERAL
+    if general:
+        entry = _entry(proxy.final(), '_hull_entry', rai.hull._compute)
+    else:
+        entry = _entry(proxy.final())
+
+    cache = flat[5]
+    if cache is not None and cache[0] is entry:
+        return cache[1]
+
+    if general:
+        bounds = _hull_bounds(transform, entry.value)
+    else:
+        bounds = rai.bvh.transform_boxes(transform, entry.value)
+
+    flat[5] = (entry, bounds)
+    return bounds
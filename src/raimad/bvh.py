@@ -0,0 +1,216 @@
+"""
+bvh.py
+Bounding volume hierarchy over the compo tree.
+
+Every real compo gets a box around everything in its hierarchy
+(in its own coordinates),
+along with the boxes of each of its subcompos
+(transformed into its coordinates).
+Since this mirrors the subcompo tree,
+the parts of a design in some region can be found
+by only descending into subcompos whose box overlaps the region,
+which is what `steamroll(region=...)` does.
+
+Boxes are [min_x, min_y, max_x, max_y] arrays.
+The box of a subcompo is the box around the transformed corners
+of the box of its compo, so it's never smaller than the exact
+bounding box, but it can be bigger if the subcompo is rotated.
+"""
+
+from typing import Iterable
+
+import numpy as np
+
+import raimad as rai
+
+EMPTY = np.array([np.inf, np.inf, -np.inf, -np.inf])
+
+class Node:
+    """
+    Node: the boxes of one compo.
+
+    Attributes
+    ----------
+    bounds: np.ndarray
+        Box around everything in the hierarchy of the compo.
+    child_bounds: np.ndarray
+        (N, 4) array with the box of each subcompo,
+        in the same order as `compo.subcompos`.
+    version: int
+        The `_version` of the compo that the node was built at,
+        see dirty.py.
+    """
+    __slots__ = ('bounds', 'child_bounds', 'version')
+
+    def __init__(
+            self,
+            bounds: np.typing.NDArray[np.float64],
+            child_bounds: np.typing.NDArray[np.float64],
+            version: int = 0,
+            ) -> None:
+        self.bounds = bounds
+        self.child_bounds = child_bounds
+        self.version = version
+
+def transform_boxes(
+        transform: 'rai.typing.Transform | np.ndarray | None',
+        boxes: np.typing.NDArray[np.float64],
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Transform boxes (an (..., 4) array),
+    returning the boxes around their transformed corners.
+    Empty boxes stay empty.
+
+    `transform` can be a Transform, None for the identity,
+    a 3x3 affine matrix,
+    or an (N, 3, 3) stack of them to transform N boxes
+    with one matrix each.
+    """
+    if transform is None:
+        return boxes
+
+    matrix = transform
+    if isinstance(transform, rai.Transform):
+        matrix = transform._affine
+
+    # x and y of the four corners
+    xs = boxes[..., [0, 0, 2, 2]]
+    ys = boxes[..., [1, 3, 1, 3]]
+    empty = boxes[..., 0] > boxes[..., 2]
+    if empty.any():
+        # Avoid inf * 0
+        xs = np.where(empty[..., np.newaxis], 0, xs)
+        ys = np.where(empty[..., np.newaxis], 0, ys)
+
+    new_xs = (
+        xs * matrix[..., 0, 0, np.newaxis]
+        + ys * matrix[..., 0, 1, np.newaxis]
+        + matrix[..., 0, 2, np.newaxis]
+        )
+    new_ys = (
+        xs * matrix[..., 1, 0, np.newaxis]
+        + ys * matrix[..., 1, 1, np.newaxis]
+        + matrix[..., 1, 2, np.newaxis]
+        )
+    transformed = np.stack(
+        (
+            new_xs.min(axis=-1),
+            new_ys.min(axis=-1),
+            new_xs.max(axis=-1),
+            new_ys.max(axis=-1),
+            ),
+        axis=-1,
+        )
+    transformed[empty] = EMPTY
+    return transformed
+
+def overlaps(
+        boxes: np.typing.NDArray[np.float64],
+        region: np.typing.NDArray[np.float64],
+        ) -> np.typing.NDArray[np.bool_]:
+    """
+    Check which boxes overlap (or touch) a region box.
+    """
+    return (
+        (boxes[..., 0] <= region[2])
+        & (boxes[..., 2] >= region[0])
+        & (boxes[..., 1] <= region[3])
+        & (boxes[..., 3] >= region[1])
+        )
+
+def as_region(region: 'rai.typing.BBox | Iterable[float]') -> np.ndarray:
+    """
+    Turn a BBox or [min_x, min_y, max_x, max_y] into a region box.
+    """
+    return np.array(list(region), dtype=np.float64).reshape(4)
+
+def node(compo: 'rai.typing.RealCompo', memo: dict | None = None) -> Node:
+    """
+    Get the BVH node of a real compo.
+
+    Every compo keeps its node until something in its hierarchy
+    changes (see dirty.py), so only the changed branches are rebuilt.
+    Pass the same `memo` dict to several calls to share the work
+    of checking the nodes between them.
+    """
+    if memo is None:
+        memo = {}
+
+    # Post-order through the compos, without recursion
+    stack = [compo]
+    while stack:
+        current = stack[-1]
+        if id(current) in memo:
+            stack.pop()
+            continue
+
+        cached = current._bvh_node
+        if cached is not None and cached.version == current._version:
+            memo[id(current)] = (current, cached)
+            stack.pop()
+            continue
+
+        children = [
+            rai.flattener._enter(proxy, None, None)
+            for proxy in current.subcompos.values()
+            ]
+        pending = [child for child, _, _ in children if id(child) not in memo]
+        if pending:
+            stack.extend(pending)
+            continue
+
+        child_bounds = np.empty((len(children), 4))
+        if children:
+            identity = rai.Transform()
+            child_bounds = transform_boxes(
+                rai.Transform.stack(
+                    identity if transform is None else transform
+                    for _, transform, _ in children
+                    ),
+                np.array([
+                    memo[id(child)][1].bounds
+                    for child, _, _ in children
+                    ]),
+                )
+
+        boxes = [child_bounds]
+        for polys in current.geoms.values():
+            if polys.num_vertices:
+                boxes.append([rai.BBox(polys.vertices).as_list()])
+        boxes = np.concatenate(boxes)
+
+        bounds = EMPTY.copy()
+        if len(boxes):
+            bounds[:2] = boxes[:, :2].min(axis=0)
+            bounds[2:] = boxes[:, 2:].max(axis=0)
+
+        current._bvh_node = Node(bounds, child_bounds, current._version)
+        # Keep the compo itself in the memo, so its id can't be reused
+        memo[id(current)] = (current, current._bvh_node)
+        stack.pop()
+
+    return memo[id(compo)][1]
+
+def bounds(
+        compo: 'rai.typing.Compo',
+        memo: dict | None = None,
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Get the box around everything in the hierarchy of a compo,
+    or of a proxy (in the coordinates that the proxy places it in).
+    """
+    real, transform, _ = rai.flattener._enter(compo, None, None)
+    return transform_boxes(transform, node(real, memo).bounds)
+
+def visible_children(
+        compo: 'rai.typing.RealCompo',
+        transform: 'rai.typing.Transform | None',
+        region: np.typing.NDArray[np.float64],
+        memo: dict | None = None,
+        ) -> np.typing.NDArray[np.bool_]:
+    """
+    Check which subcompos of a compo overlap a region,
+    if the compo itself is placed with `transform`.
+    """
+    child_bounds = node(compo, memo).child_bounds
+    return overlaps(transform_boxes(transform, child_bounds), region)
@@ -1,8 +1,20 @@
+import numpy as np
+
+import raimad as rai
+
 class NoReuse:
-    def __init__(self, compo, multiplier=1e3):
+    def __init__(self, compo, multiplier=1e3, layers=None, region=None):
         self.compo = compo
         self.rout_num = 1
         self.multiplier = multiplier
+        # Only export these (top-level) layers, if given
+        self.layers = rai.flattener._layer_set(layers)
+        self._reachable_memo = {}
+        # Only export subcompos that overlap this box, if given
+        self.region = None if region is None else rai.bvh.as_region(region)
+        self._bvh_memo = {}
+        self._to_cif = rai.Transform().scale(multiplier)
+        self._workspace = rai.affine.Workspace()
 
         self.cif_string = self._export_cif()
 
@@ -18,6 +30,34 @@ class NoReuse:
         yield f'C {first_rout};\n'
         yield 'E'
 
+    def _cif_coords(self, polys):
+        """
+        Convert the vertices of some PackedPolys into integer CIF units.
+        If the polys are stored in database units,
+        and the multiplier turns a database unit into a whole number
+        of CIF units, this is done in exact integer arithmetic.
+        """
+        dbu = polys.storage.dbu
+        if dbu is not None:
+            units_per_dbu = dbu * self.multiplier
+            if np.isclose(units_per_dbu, np.rint(units_per_dbu)):
+                return polys.raw * int(np.rint(units_per_dbu))
+
+        # Scale in double precision even for float32 geometry,
+        # then truncate towards zero, same as int()
+        scratch = self._workspace.get(
+            (polys.num_vertices, 2),
+            np.float64,
+            slot=3,
+            )
+        np.copyto(scratch, polys.vertices)
+        self._to_cif.transform_xyarray(
+            scratch,
+            out=scratch,
+            workspace=self._workspace,
+            )
+        return scratch.astype(np.int64)
+
     def yield_cif_bare(self, compo):
         """
         Yield lines of CIF of a particular component,
@@ -32,14 +72,15 @@ class NoReuse:
 
         # Export all geometries
         for layer, geom in compo.geoms.items():
+            if self.layers is not None and layer not in self.layers:
+                continue
             yield f'\tL L{layer};\n'
-            for poly in geom:
+            coords = self._cif_coords(geom).tolist()
+            bounds = geom.offsets.tolist()
+            for start, stop in zip(bounds[:-1], bounds[1:]):
                 yield '\tP '
-                for point in poly:
-                    yield (
-                        f'{int(point[0] * self.multiplier)} '
-                        f'{int(point[1] * self.multiplier)} '
-                        )
+                for x, y in coords[start:stop]:
+                    yield f'{x} {y} '
                 yield ';\n'
 
         # Precompute a list of [routine number, subcomponent]
@@ -50,6 +91,20 @@ class NoReuse:
         # the routine number
         subcompos = []
         for subcompo in compo.subcompos.values():
+            if self.layers is not None and self.layers.isdisjoint(
+                    rai.flattener.reachable_layers(
+                        subcompo,
+                        self._reachable_memo,
+                        )
+                    ):
+                # Nothing on the exported layers down there
+                continue
+            if self.region is not None and not rai.bvh.overlaps(
+                    rai.bvh.bounds(subcompo, self._bvh_memo),
+                    self.region,
+                    ):
+                # Nothing in the exported region down there
+                continue
             subcompos.append([
                 self.rout_num,
                 list(self.yield_cif_bare(subcompo))
@@ -1,3 +1,4 @@
+from typing import Iterable, Iterator
 import inspect
 
 try:
@@ -7,6 +8,7 @@ except ImportError:
     from typing_extensions import Self
 
 from copy import deepcopy
+import weakref
 
 import raimad as rai
 
@@ -30,43 +32,253 @@ class MarksContainer(rai.DictList):
         return new
 
 class SubcompoContainer(rai.DictList):
+    # Weak reference to this container, shared by everything
+    # it's registered on, see dirty.py
+    _ref: 'weakref.ref[SubcompoContainer] | None' = None
+
+    def __setitem__(self, key, value):
+        self._check_frozen()
+        super().__setitem__(key, self._filter(value))
+
     def _filter(self, item):
         if isinstance(item, rai.Compo):
-            return rai.Proxy(item, _autogen=True)
-        elif isinstance(item, rai.Proxy):
-            return item
-        else:
+            item = rai.Proxy(item, _autogen=True)
+        elif not isinstance(item, rai.Proxy):
             raise Exception  # TODO actual exception
+        if self._ref is None:
+            self._ref = weakref.ref(self)
+        rai.dirty.add_proxy_parent(item, self._ref)
+        return item
         # TODO generally need to standardize runtime checks.
 
+def _freeze(node: 'rai.typing.Compo') -> None:
+    """
+    Freeze a compo or proxy and everything below it.
+    Iterative, so deep hierarchies don't hit the recursion limit.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if not node._frozen:
+            stack.extend(node._freeze_one())
+
 class Compo:
-    marks: MarksContainer
-    subcompos: SubcompoContainer
+    # Set this to a rai.CompoCache to reuse compos
+    # constructed with the same options, see memo.py
+    compo_cache: 'rai.CompoCache | None' = None
+
+    # Set this to True to only record the options on construction,
+    # and run `_make` the first time the geometry, subcompos or marks
+    # are needed.
+    lazy: bool = False
+
+    # Set this to True to freeze compos as soon as `_make` returns.
+    freeze_on_make: bool = False
+
+    # Layers reachable from this compo, with the `_version`
+    # they were found at, see `reachable_layers()`
+    _reachable_layers: tuple[int, frozenset[str]] | None = None
+
+    # Bounding volume hierarchy node, see bvh.py
+    _bvh_node: 'rai.bvh.Node | None' = None
+
+    # Cached bounding box, see bboxcache.py
+    _bbox_entry: 'rai.bboxcache._Entry | None' = None
+
+    # Cached convex hull, see hull.py
+    _hull_entry: 'rai.bboxcache._Entry | None' = None
+
+    # Subcompo containers with proxies that point to this compo,
+    # and a number that changes whenever anything in its hierarchy does,
+    # see dirty.py
+    _parents: 'weakref.ref | list[weakref.ref] | None' = None
+    _version: int = 0
+
+    def __new__(cls, *args, **kwargs):
+        if cls.compo_cache is not None:
+            compo = cls.compo_cache.get(cls, args, kwargs)
+            if compo is not None:
+                return compo
+        return super().__new__(cls)
 
     def __init__(self, *args, **kwargs):
-        self.geoms = {}
-        self.subcompos = SubcompoContainer()
-        self.marks = MarksContainer()
+        if '_make_args' in vars(self):
+            # Came out of the compo cache, already made
+            return
+        self._make_args = (args, kwargs)
+        self._made = False
+        self._frozen = False
+        self._new_contents(rai.get_storage())
+
+        if not self.lazy:
+            self._ensure_made()
+
+        # Lazy compos are cached before they're made,
+        # `_ensure_made` takes them out again if `_make` fails
+        if type(self).compo_cache is not None:
+            type(self).compo_cache.put(type(self), args, kwargs, self)
+
+    def _new_contents(self, storage: 'rai.Storage') -> None:
+        """
+        Give this compo new, empty geometry, subcompos and marks.
+        """
+        self._geoms = rai.PackedGeoms(storage=storage)
+        self._subcompos = SubcompoContainer()
+        self._marks = MarksContainer()
+        rai.dirty.add_parent(self._geoms, self)
+        rai.dirty.add_parent(self._subcompos, self)
+
+    def _ensure_made(self):
+        """
+        Run `_make`, unless it has already been run.
+        If `_make` fails, whatever it added is thrown away,
+        and it's run again the next time it's needed.
+        """
+        if self._made:
+            return
+        self._made = True
+
+        args, kwargs = self._make_args
+        storage = self._geoms.storage
+        try:
+            if rai.get_storage() is storage:
+                self._make(*args, **kwargs)
+            else:
+                # Lazy compo being made outside of the `rai.storage` block
+                # it was created in
+                with rai.storage(**vars(storage)):
+                    self._make(*args, **kwargs)
+        except BaseException:
+            self._made = False
+            self._new_contents(storage)
+            # Anything cached from the half-made compo is stale
+            self._version += 1
+            rai.dirty.changed(self)
+            # Don't hand out a half-made compo from the cache
+            if type(self).compo_cache is not None:
+                type(self).compo_cache.discard(type(self), args, kwargs, self)
+            raise
+
+        intern_table = storage.intern_table
+        if intern_table is not None:
+            self._geoms.intern(intern_table)
+
+        if self.freeze_on_make:
+            self.freeze()
+
+    def freeze(self) -> Self:
+        """
+        Make this compo immutable.
+
+        The geometry becomes read-only,
+        no more subcompos or marks can be added,
+        and all subcompos (and the compos they point to)
+        are frozen as well, so nothing in the hierarchy below
+        this compo can change anymore.
+        Trying to change any of that raises rai.err.FrozenError.
+        This makes it safe to share the compo and to cache results
+        computed from it.
+        """
+        _freeze(self)
+        return self
+
+    def _freeze_one(self) -> 'list[rai.typing.Proxy]':
+        """
+        Freeze this compo, but not its subcompos,
+        and return the subcompos, see `_freeze()`.
+        """
+        self._ensure_made()
+        self._frozen = True
+        self._geoms._freeze()
+        self._subcompos._freeze()
+        self._marks._freeze()
+        return list(self._subcompos.values())
+
+    @property
+    def frozen(self) -> bool:
+        return self._frozen
 
-        self._make(*args, **kwargs)
+    @property
+    def geoms(self) -> 'rai.PackedGeoms':
+        self._ensure_made()
+        return self._geoms
+
+    @geoms.setter
+    def geoms(self, layers: 'rai.typing.Geoms') -> None:
+        # Replaces the layers of the existing PackedGeoms,
+        # packing whatever is assigned
+        self._ensure_made()
+        layers = list(layers.items())
+        self._geoms.clear()
+        self._geoms.update(layers)
+
+    @property
+    def subcompos(self) -> SubcompoContainer:
+        self._ensure_made()
+        return self._subcompos
+
+    @property
+    def marks(self) -> MarksContainer:
+        self._ensure_made()
+        return self._marks
 
     @classmethod
     def partial(cls, **kwargs):
         return rai.Partial(cls, **kwargs)
 
-    def steamroll(self) -> dict:
+    def steamroll(
+            self,
+            layers: 'str | Iterable[str] | None' = None,
+            region: 'rai.typing.BBox | Iterable[float] | None' = None,
+            ) -> 'rai.typing.Geoms':
         """
-        Steamroll the entire compo hierarchy into one Geoms dict
-        TODO more informative
+        Steamroll the entire compo hierarchy into one PackedGeoms.
+        If `layers` is given, only those layers are steamrolled.
+        If `region` is given, only subcompos that overlap it are
+        steamrolled, see `rai.flatten_geoms()`.
         """
-        geoms = self.geoms.copy()
-        for subcompo in self.subcompos.values():
-            # TODO override "update" method in geoms container?
-            for layer_name, layer_geoms in subcompo.steamroll().items():
-                if layer_name not in geoms.keys():
-                    geoms[layer_name] = []
-                geoms[layer_name].extend(layer_geoms)
-        return geoms
+        return rai.flattener.flatten_geoms(self, layers, region)
+
+    def steamroll_view(
+            self,
+            layers: 'str | Iterable[str] | None' = None,
+            region: 'rai.typing.BBox | Iterable[float] | None' = None,
+            ) -> 'rai.GeomsView':
+        """
+        Like `steamroll()`, but return a read-only GeomsView
+        that only transforms a layer when it is accessed.
+        """
+        return rai.GeomsView(
+            rai.flattener._pieces(self, layers=layers, region=region),
+            self._geoms.storage,
+            spill=True,
+            )
+
+    def iter_steamroll(
+            self,
+            max_vertices: int = 1 << 20,
+            layers: 'str | Iterable[str] | None' = None,
+            region: 'rai.typing.BBox | Iterable[float] | None' = None,
+            ) -> 'Iterator[tuple[str, rai.PackedPolys]]':
+        """
+        Steamroll the compo hierarchy in (layer, polys) batches
+        of at most `max_vertices` vertices,
+        without holding the whole flattened design in memory.
+        """
+        return rai.flattener.iter_geoms(self, max_vertices, layers, region)
+
+    def reachable_layers(self) -> frozenset[str]:
+        """
+        Get the layers that anything in the compo hierarchy ends up on.
+        """
+        return rai.flattener.reachable_layers(self)
+
+    def convex_hull(self) -> 'rai.typing.PolyArray':
+        """
+        Get the convex hull of everything in the compo hierarchy,
+        as an N x 2 array of points in counterclockwise order.
+        """
+        return rai.hull.compo_hull(self)
 
     def final(self):
         return self
@@ -147,11 +359,7 @@ class Compo:
     # bbox functions #
     @property
     def bbox(self):
-        bbox = rai.BBox()
-        for geoms in self.steamroll().values():
-            for geom in geoms:
-                bbox.add_xyarray(geom)
-        return bbox
+        return rai.BBox.from_bounds(rai.bboxcache.compo_bounds(self))
 
     def __init_subclass__(cls):
         _class_to_dictlist(cls, 'Marks', rai.Mark)
@@ -8,6 +8,8 @@ from typing import (
      Any,
      )
 
+import raimad as rai
+
 # This class could also be implemented by deriving from `dict`
 # instead of encapsulating it
 # (actually, that's how it worked originally),
@@ -16,12 +18,25 @@ from typing import (
 
 # TODO tests for this class!
 
+class FrozenError(Exception):
+    """
+    FrozenError: attempted to modify something that has been frozen.
+
+    Compos (and their geometry, subcompos and marks) can be frozen
+    with `Compo.freeze()`, and proxies with `Proxy.freeze()`.
+    """
+
 T = TypeVar('T')
 class DictList(Generic[T]):
     """
     A dict that is also a list and is accesible with attribute syntax!
     """
     _dict: dict[str | int, T]
+    _frozen: bool = False
+
+    # See dirty.py
+    _parents: Any = None
+    _version: int = 0
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         self._dict = dict(*args, **kwargs)
@@ -35,8 +50,30 @@ class DictList(Generic[T]):
         if hasattr(self.__class__, name):
             raise Exception  # TODO actual exception
         else:
+            self._modify()
             self._dict[name] = self._filter(value)
 
+    def _check_frozen(self) -> None:
+        if self._frozen:
+            raise FrozenError(
+                f"Tried to modify a frozen {type(self).__name__}"
+                )
+
+    def _modify(self) -> None:
+        """
+        Check that the dictlist may be modified,
+        and mark anything that depends on it dirty.
+        """
+        self._check_frozen()
+        if self._parents is not None:
+            rai.dirty.changed(self)
+
+    def _freeze(self) -> None:
+        """
+        Forbid adding or replacing items from now on.
+        """
+        self._frozen = True
+
     def __getattr__(self, name: str) -> T:
         return self._dict[name]
 
@@ -46,11 +83,13 @@ class DictList(Generic[T]):
         return self._dict.__getitem__(key)
 
     def __setitem__(self, key: str | int, value: T) -> None:
+        self._modify()
         if isinstance(key, int):
             list(self._dict.values())[key] = value
         self._dict.__setitem__(key, value)
 
     def append(self, item: T) -> None:
+        self._modify()
         self._dict[len(self._dict)] = self._filter(item)
 
     def extend(self, items: Iterable[T]) -> None:
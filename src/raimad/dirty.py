@@ -0,0 +1,112 @@
+"""
+dirty.py
+Change tracking for compo hierarchies.
+
+Everything that can change under a compo
+(transforms, geometry, subcompo containers, compos)
+keeps weak references to its parents: the things that depend on it.
+Proxies mostly don't, to keep them small: a subcompo container
+is registered directly on the transforms of the proxies it holds
+and on the compos they point to, see `add_proxy_parent()`,
+and a proxy's own changes go through its transform.
+Only a proxy that still shares the identity transform
+keeps the links itself, until it gets its own transform
+(see `Proxy._links()`).
+So temporary proxies, that aren't in any container,
+aren't linked to anything.
+Changing something bumps the `_version` of all of its parents,
+their parents, and so on up to the top of every hierarchy it's in,
+and nothing else.
+
+So a compo's `_version` changes whenever anything in its hierarchy
+changes, and caches (bboxes, hulls, BVH nodes, reachable layers)
+can be checked by comparing one number,
+instead of going through the whole hierarchy.
+Only the branches that changed are rebuilt.
+
+Reassigning `proxy.transform`, `proxy.lmap` or `proxy.compo` directly
+isn't tracked; use `move()`, `map()`, etc. instead.
+"""
+
+import weakref
+
+import raimad as rai
+
+# Drop dead references from a list of parents when it reaches
+# a power of two at least this long
+_PRUNE_MIN = 8
+
+def add_parent(child: object, parent: object) -> None:
+    """
+    Record that `parent` depends on `child`,
+    so that changes to `child` mark `parent` dirty.
+    `parent` can also be a weak reference to the parent,
+    to share one between several children.
+
+    `child` must have a `_parents` attribute (None to begin with),
+    which is then a weak reference to the one parent,
+    or a list of them if there are more.
+    """
+    ref = parent if type(parent) is weakref.ref else weakref.ref(parent)
+    parents = child._parents
+    if parents is None:
+        child._parents = ref
+    elif type(parents) is weakref.ref:
+        if parents is not ref:
+            child._parents = [parents, ref]
+    elif parents[-1] is not ref:
+        parents.append(ref)
+        count = len(parents)
+        if count >= _PRUNE_MIN and not count & (count - 1):
+            # Weak references compare (and hash) like their referents,
+            # so this also drops duplicates
+            parents[:] = dict.fromkeys(
+                ref for ref in parents if ref() is not None
+                )
+
+def add_proxy_parent(proxy: 'rai.typing.Proxy', parent: object) -> None:
+    """
+    Record that `parent` depends on a proxy:
+    on every proxy in its chain (through their transforms),
+    and on the real compo at the end of it.
+    """
+    ref = parent if type(parent) is weakref.ref else weakref.ref(parent)
+    while isinstance(proxy, rai.Proxy):
+        add_parent(proxy._links(), ref)
+        proxy = proxy.compo
+    add_parent(proxy, ref)
+
+def changed(child: object) -> None:
+    """
+    Record that something changed,
+    bumping the `_version` of everything that depends on it,
+    each one once.
+    """
+    # Fast path for a chain with one parent at each step,
+    # which is what new compos and proxies look like.
+    # Nothing can be reached twice along it.
+    parents = child._parents
+    while type(parents) is weakref.ref:
+        current = parents()
+        if current is None:
+            return
+        current._version += 1
+        parents = current._parents
+    if parents is None:
+        return
+
+    # Iterative, so deep hierarchies don't hit the recursion limit
+    seen = set()
+    stack = [parents]
+    while stack:
+        parents = stack.pop()
+        if type(parents) is weakref.ref:
+            parents = (parents, )
+        for ref in parents:
+            current = ref()
+            if current is None or id(current) in seen:
+                continue
+            seen.add(id(current))
+            current._version += 1
+            if current._parents is not None:
+                stack.append(current._parents)
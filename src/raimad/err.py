@@ -15,6 +15,10 @@ from raimad.rectwire import RectWireIncorrectArgumentsError
 
 from raimad.bbox import EmptyBBoxError
 
+from raimad.dictlist import FrozenError
+
+from raimad.memo import UncacheableOptionError
+
 from raimad.cif.shorthand import InvalidDestinationError
 #from raimad.cif import CIFExportError
 #from raimad.cif import CannotCompileTransformError
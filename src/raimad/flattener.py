@@ -0,0 +1,763 @@
+"""
+flattener.py
+Single-pass flattening of compo hierarchies.
+
+Flattening used to recurse through the hierarchy,
+with every proxy transforming and copying the whole flattened
+geometry of everything below it,
+so a polygon at depth d was transformed and copied d times.
+The flattener instead walks the hierarchy once
+(iteratively, so there is no recursion limit),
+composing transforms and lmaps on the way down,
+and then transforms every polygon exactly once,
+straight into preallocated output buffers.
+"""
+
+from collections.abc import Mapping
+from typing import Iterable, Iterator
+import itertools
+
+import numpy as np
+
+import raimad as rai
+
+class _LayerResolver:
+    """
+    Resolves layer names through a chain of lmaps,
+    innermost lmap first, remembering the results.
+    """
+    __slots__ = ('lmap', 'outer', 'targets')
+
+    def __init__(
+            self,
+            lmap: 'rai.typing.LMap',
+            outer: '_LayerResolver | None',
+            ) -> None:
+        self.lmap = lmap
+        self.outer = outer
+        self.targets: dict[str, str] = {}
+
+    def __getitem__(self, layer: str) -> str:
+        target = self.targets.get(layer)
+        if target is None:
+            target = self.lmap[layer]
+            if self.outer is not None:
+                target = self.outer[target]
+            self.targets[layer] = target
+        return target
+
+def _enter(
+        proxy: 'rai.typing.Compo',
+        transform: 'rai.typing.Transform | None',
+        resolver: _LayerResolver | None,
+        ) -> (
+            'tuple[rai.typing.RealCompo, rai.typing.Transform | None, '
+            '_LayerResolver | None]'
+            ):
+    """
+    Go from a proxy (through any proxies it points to)
+    down to the real compo,
+    composing transforms and lmaps along the way.
+    A transform or resolver of None stands for the identity.
+    """
+    chain = []
+    while isinstance(proxy, rai.Proxy):
+        chain.append(proxy)
+        proxy = proxy.compo
+
+    if chain:
+        # Innermost proxy first
+        flat = chain[-1]._transform.copy()
+        for outer in reversed(chain[:-1]):
+            flat.compose(outer._transform)
+        if transform is not None:
+            flat.compose(transform)
+        transform = flat
+
+    # Outermost proxy first
+    for outer in chain:
+        if outer._lmap.shorthand is not None:
+            resolver = _LayerResolver(outer._lmap, resolver)
+
+    return proxy, transform, resolver
+
+def _enter_lmaps(
+        proxy: 'rai.typing.Compo',
+        resolver: _LayerResolver | None,
+        ) -> 'tuple[rai.typing.RealCompo, _LayerResolver | None]':
+    """
+    Like `_enter()`, but only for the lmaps.
+    """
+    chain = []
+    while isinstance(proxy, rai.Proxy):
+        chain.append(proxy)
+        proxy = proxy.compo
+
+    for outer in chain:
+        if outer._lmap.shorthand is not None:
+            resolver = _LayerResolver(outer._lmap, resolver)
+
+    return proxy, resolver
+
+def _layer_set(layers: 'str | Iterable[str] | None') -> set[str] | None:
+    """
+    Turn a `layers` argument into a set of layer names (or None for all).
+    """
+    if layers is None:
+        return None
+    if isinstance(layers, str):
+        return {layers}
+    return set(layers)
+
+def reachable_layers(
+        compo: 'rai.typing.Compo',
+        memo: dict | None = None,
+        ) -> frozenset[str]:
+    """
+    Get the layers that the geometry in the hierarchy of `compo`
+    ends up on (including empty layers).
+
+    Every compo keeps the result until something in its hierarchy
+    changes (see dirty.py).
+    Pass the same `memo` dict to several calls to share the work
+    of checking the results between them.
+    """
+    if memo is None:
+        memo = {}
+
+    top, top_resolver = _enter_lmaps(compo, None)
+
+    # Post-order through the compos, without recursion
+    stack = [top]
+    while stack:
+        current = stack[-1]
+        if id(current) in memo:
+            stack.pop()
+            continue
+
+        cached = current._reachable_layers
+        if cached is not None and cached[0] == current._version:
+            memo[id(current)] = (current, cached[1])
+            stack.pop()
+            continue
+
+        children = [
+            _enter_lmaps(proxy, None)
+            for proxy in current.subcompos.values()
+            ]
+        pending = [child for child, _ in children if id(child) not in memo]
+        if pending:
+            stack.extend(pending)
+            continue
+
+        layers = set(current.geoms.keys())
+        for child, resolver in children:
+            child_layers = memo[id(child)][1]
+            if resolver is None:
+                layers.update(child_layers)
+            else:
+                layers.update(resolver[layer] for layer in child_layers)
+
+        layers = frozenset(layers)
+        current._reachable_layers = (current._version, layers)
+        # Keep the compo itself in the memo, so its id can't be reused
+        memo[id(current)] = (current, layers)
+        stack.pop()
+
+    layers = memo[id(top)][1]
+    if top_resolver is None:
+        return layers
+    return frozenset(top_resolver[layer] for layer in layers)
+
+def walk(
+        compo: 'rai.typing.Compo',
+        layers: 'str | Iterable[str] | None' = None,
+        region: 'rai.typing.BBox | Iterable[float] | None' = None,
+        ) -> (
+            'Iterator[tuple['
+            'rai.typing.RealCompo, rai.typing.Transform | None, '
+            '_LayerResolver | None, int, str | int | None'
+            ']]'
+            ):
+    """
+    Visit every real compo in the hierarchy of `compo`,
+    in the same order that `steamroll()` adds their geometry.
+
+    Yields (compo, transform, resolver, parent, name) tuples,
+    where `transform` is the flat transform from that compo
+    to the top of the hierarchy (None for the identity),
+    `resolver[layer]` gives the top-level layer
+    that a layer of that compo ends up on
+    (`resolver` is None if layers are not renamed),
+    `parent` is the index (in visiting order) of the parent compo
+    (-1 for `compo` itself),
+    and `name` is the name of the subcompo in its parent
+    (None for `compo` itself).
+
+    If `layers` is given, subcompos with nothing
+    on any of those (top-level) layers are skipped,
+    along with everything under them.
+    Likewise, if `region` is given, subcompos whose bounding box
+    (see bvh.py) misses that box are skipped.
+    """
+    layers = _layer_set(layers)
+    if region is not None:
+        region = rai.bvh.as_region(region)
+    memo: dict = {}
+    bvh_memo: dict = {}
+
+    def children(
+            compo: 'rai.typing.RealCompo',
+            transform: 'rai.typing.Transform | None',
+            ) -> 'Iterator[tuple[str | int, rai.typing.Proxy]]':
+        if region is None:
+            return iter(compo.subcompos.items())
+        return itertools.compress(
+            compo.subcompos.items(),
+            rai.bvh.visible_children(compo, transform, region, bvh_memo),
+            )
+
+    compo, transform, resolver = _enter(compo, None, None)
+    yield compo, transform, resolver, -1, None
+
+    index = 0
+    stack = [(children(compo, transform), transform, resolver, index)]
+    while stack:
+        siblings, transform, resolver, parent = stack[-1]
+        name, proxy = next(siblings, (None, None))
+        if proxy is None:
+            stack.pop()
+            continue
+
+        if layers is not None:
+            child, child_resolver = _enter_lmaps(proxy, resolver)
+            reachable = reachable_layers(child, memo)
+            if child_resolver is not None:
+                reachable = {child_resolver[layer] for layer in reachable}
+            if layers.isdisjoint(reachable):
+                continue
+
+        child, child_transform, child_resolver = _enter(
+            proxy,
+            transform,
+            resolver,
+            )
+        yield child, child_transform, child_resolver, parent, name
+        index += 1
+        stack.append((
+            children(child, child_transform),
+            child_transform,
+            child_resolver,
+            index,
+            ))
+
+class InstanceTable:
+    """
+    InstanceTable: every compo placed in a hierarchy, as columns.
+
+    Row 0 is the top-level compo itself,
+    and the other rows follow in the same order as `walk()`.
+
+    Attributes
+    ----------
+    compos: list[rai.typing.RealCompo]
+        The real compo (definition) of every placement.
+    affines: np.ndarray
+        (N, 3, 3) array of the flat affine matrix of every placement,
+        i.e. from the coordinates of the compo to the top level.
+    lmaps: list[rai.LMap]
+        The flat lmap of every placement.
+        Placements with the same lmaps along their path
+        share the same LMap, so don't modify them.
+    parents: np.ndarray
+        Row of the parent of every placement (-1 for row 0).
+    names: list[str | int | None]
+        Name of every placement in the subcompos of its parent
+        (None for row 0).
+    """
+    __slots__ = ('compos', 'affines', 'lmaps', 'parents', 'names')
+
+    def __init__(
+            self,
+            compos: 'list[rai.typing.RealCompo]',
+            affines: 'np.typing.NDArray[np.float64]',
+            lmaps: 'list[rai.typing.LMap]',
+            parents: 'np.typing.NDArray[np.int64]',
+            names: list[str | int | None],
+            ) -> None:
+        self.compos = compos
+        self.affines = affines
+        self.lmaps = lmaps
+        self.parents = parents
+        self.names = names
+
+    def path(self, index: int) -> tuple[str | int, ...]:
+        """
+        Get the subcompo names leading from the top to a placement.
+        """
+        path = []
+        while self.parents[index] >= 0:
+            path.append(self.names[index])
+            index = self.parents[index]
+        return tuple(reversed(path))
+
+    def depths(self) -> 'np.typing.NDArray[np.int64]':
+        """
+        Get the depth of every placement (0 for row 0).
+        """
+        depths = np.zeros(len(self), dtype=np.int64)
+        # Parents always come before their children
+        for index in range(1, len(self)):
+            depths[index] = depths[self.parents[index]] + 1
+        return depths
+
+    def __len__(self) -> int:
+        return len(self.compos)
+
+    def __repr__(self) -> str:
+        return f"<InstanceTable of {len(self)} placements>"
+
+def flatten_instances(compo: 'rai.typing.Compo') -> InstanceTable:
+    """
+    List every compo placed in the hierarchy of `compo`,
+    along with its flat transform and lmap, in one traversal.
+    """
+    compos = []
+    transforms = []
+    lmaps = []
+    parents = []
+    names = []
+
+    identity = rai.Transform()
+    flat_lmaps: dict[int, tuple] = {}
+    for real, transform, resolver, parent, name in walk(compo):
+        compos.append(real)
+        transforms.append(identity if transform is None else transform)
+        lmaps.append(_flat_lmap(resolver, flat_lmaps))
+        parents.append(parent)
+        names.append(name)
+
+    return InstanceTable(
+        compos,
+        rai.Transform.stack(transforms),
+        lmaps,
+        np.array(parents, dtype=np.int64),
+        names,
+        )
+
+def _flat_lmap(
+        resolver: _LayerResolver | None,
+        flat_lmaps: dict[int, tuple],
+        ) -> 'rai.typing.LMap':
+    """
+    Combine the lmaps of a resolver into one LMap,
+    reusing the LMaps already made for its outer resolvers.
+    """
+    # Keep the resolvers themselves in the cache,
+    # so their ids can't be reused
+    chain = []
+    while id(resolver) not in flat_lmaps:
+        if resolver is None:
+            flat_lmaps[id(None)] = (None, rai.LMap(None))
+            break
+        chain.append(resolver)
+        resolver = resolver.outer
+
+    lmap = flat_lmaps[id(resolver)][1]
+    for inner in reversed(chain):
+        lmap = inner.lmap.copy().compose(lmap)
+        flat_lmaps[id(inner)] = (inner, lmap)
+
+    return lmap
+
+def _pieces(
+        compo: 'rai.typing.Compo',
+        nested: bool = True,
+        layers: 'str | Iterable[str] | None' = None,
+        region: 'rai.typing.BBox | Iterable[float] | None' = None,
+        ) -> list:
+    """
+    List the (polys, transform, target layer) of every layer
+    of every compo in the hierarchy of `compo`,
+    or just of the real compo behind it if `nested` is False.
+    Only target layers in `layers` are listed, if given,
+    and only compos near `region`, if given (see `walk()`).
+    """
+    layers = _layer_set(layers)
+    pieces = []
+    for real, transform, resolver, _, _ in walk(compo, layers, region):
+        for layer, polys in real.geoms.items():
+            target = layer if resolver is None else resolver[layer]
+            if layers is None or target in layers:
+                pieces.append((polys, transform, target))
+        if not nested:
+            break
+    return pieces
+
+def _assemble(
+        pieces: list,
+        storage: 'rai.Storage',
+        spill: bool,
+        layers: 'Iterable[str] | None' = None,
+        ) -> 'rai.PackedGeoms':
+    """
+    Transform pieces into a new PackedGeoms,
+    or only the pieces that go to some `layers`.
+    """
+    if layers is not None:
+        layers = set(layers)
+
+    # First pass: find out where everything goes
+    placed = []
+    totals: dict[str, list[int]] = {}
+    for polys, transform, target in pieces:
+        if layers is not None and target not in layers:
+            continue
+        total = totals.setdefault(target, [0, 0])
+        placed.append((polys, transform, target, total[0], total[1]))
+        total[0] += polys.num_vertices
+        total[1] += len(polys)
+
+    geoms = rai.PackedGeoms(storage=storage, spill=spill)
+    for target, (num_vertices, num_polys) in totals.items():
+        out = geoms.setdefault(target)
+        out._reserve(num_vertices, num_polys)
+        out._num_vertices = num_vertices
+        out._num_polys = num_polys
+
+    # Group the pieces by vertex buffer,
+    # since many placements of the same compo share it
+    placements: dict[int, list] = {}
+    for polys, transform, target, vertex_start, poly_start in placed:
+        placements.setdefault(id(polys), []).append(
+            (polys, transform, geoms[target], vertex_start, poly_start)
+            )
+
+    # Second pass: write everything
+    workspace = rai.affine.Workspace()
+    for group in placements.values():
+        _write_offsets(group)
+
+        polys = group[0][0]
+        if (
+                len(group) > 1
+                and polys.num_vertices
+                and polys.storage.dbu is None
+                and storage.dbu is None
+                and polys.raw.dtype == storage.dtype
+                ):
+            _write_stacked(group)
+            continue
+
+        for polys, transform, out, vertex_start, _ in group:
+            _write(polys, transform, out, vertex_start, workspace)
+
+    return geoms
+
+def flatten_geoms(
+        compo: 'rai.typing.Compo',
+        layers: 'str | Iterable[str] | None' = None,
+        region: 'rai.typing.BBox | Iterable[float] | None' = None,
+        ) -> 'rai.PackedGeoms':
+    """
+    Flatten the hierarchy of `compo` into one PackedGeoms.
+
+    Every polygon is transformed exactly once,
+    with the flat transform of the compo it belongs to.
+    Many placements of the same compo are transformed together,
+    with `rai.affine.transform_stack()`.
+    If `layers` is given, only those (top-level) layers are flattened,
+    and subcompos with nothing on them aren't visited at all.
+    If `region` (a BBox or [min_x, min_y, max_x, max_y]) is given,
+    subcompos whose bounding box misses it aren't visited at all.
+    Polygons are not clipped to the region, so everything
+    in the compos that are visited is still included.
+    """
+    return _assemble(
+        _pieces(compo, layers=layers, region=region),
+        compo.final().geoms.storage,
+        spill=True,
+        )
+
+def iter_geoms(
+        compo: 'rai.typing.Compo',
+        max_vertices: int = 1 << 20,
+        layers: 'str | Iterable[str] | None' = None,
+        region: 'rai.typing.BBox | Iterable[float] | None' = None,
+        ) -> 'Iterator[tuple[str, rai.PackedPolys]]':
+    """
+    Flatten the hierarchy of `compo` bit by bit.
+    See `flatten_geoms()` for `layers` and `region`.
+
+    Yields (layer, polys) batches in the same order as `walk()`,
+    each with at most `max_vertices` vertices
+    (unless a single polygon has more than that).
+    Consecutive compos that put geometry on the same layer
+    share batches.
+    Only one batch is kept in memory at a time,
+    along with the stack of the walk through the hierarchy.
+    """
+    layers = _layer_set(layers)
+    storage = compo.final().geoms.storage
+    batch: list = []
+    batch_layer = None
+    batch_vertices = 0
+
+    for real, transform, resolver, _, _ in walk(compo, layers, region):
+        for layer, polys in real.geoms.items():
+            target = layer if resolver is None else resolver[layer]
+            if layers is not None and target not in layers:
+                continue
+            for part in _split(polys, max_vertices):
+                if batch and (
+                        target != batch_layer
+                        or batch_vertices + part.num_vertices > max_vertices
+                        ):
+                    geoms = _assemble(batch, storage, False)
+                    yield batch_layer, geoms[batch_layer]
+                    batch = []
+                    batch_vertices = 0
+
+                batch_layer = target
+                batch.append((part, transform, target))
+                batch_vertices += part.num_vertices
+
+    if batch:
+        geoms = _assemble(batch, storage, False)
+        yield batch_layer, geoms[batch_layer]
+
+def _split(
+        polys: 'rai.PackedPolys',
+        max_vertices: int,
+        ) -> 'Iterator[rai.PackedPolys]':
+    """
+    Split polys (without copying) into parts of at most `max_vertices`
+    vertices, never splitting a polygon.
+    Empty polys are skipped.
+    """
+    if not len(polys):
+        return
+    if polys.num_vertices <= max_vertices:
+        yield polys
+        return
+
+    offsets = polys.offsets
+    start = 0
+    while start < len(polys):
+        stop = int(np.searchsorted(
+            offsets,
+            offsets[start] + max_vertices,
+            side='right',
+            )) - 1
+        stop = max(stop, start + 1)
+        yield rai.PackedPolys.from_buffers(
+            polys.raw[offsets[start]:offsets[stop]],
+            offsets[start:stop + 1] - offsets[start],
+            polys.storage,
+            )
+        start = stop
+
+class GeomsView(Mapping):
+    """
+    GeomsView: read-only geometry that is transformed lazily.
+
+    This is what `Proxy.geoms` and `steamroll_view()` return.
+    It can be used like a PackedGeoms,
+    but the transformed coordinates of a layer are only computed
+    the first time that layer is accessed, and then kept.
+    Listing layers and counting polygons or vertices
+    doesn't transform anything.
+
+    Use `materialize()` to get a regular PackedGeoms.
+    """
+
+    def __init__(
+            self,
+            pieces: list,
+            storage: 'rai.Storage',
+            spill: bool = False,
+            ) -> None:
+        self.storage = storage
+        self.spill = spill
+        self._pieces = pieces
+        self._targets = dict.fromkeys(target for _, _, target in pieces)
+        self._layers: dict[str, rai.PackedPolys] = {}
+
+    def __getitem__(self, layer: str) -> 'rai.PackedPolys':
+        polys = self._layers.get(layer)
+        if polys is None:
+            if layer not in self._targets:
+                raise KeyError(layer)
+            polys = _assemble(
+                self._pieces,
+                self.storage,
+                self.spill,
+                (layer, ),
+                )[layer]
+            # Shared by everyone who uses this view
+            polys._freeze()
+            self._layers[layer] = polys
+        return polys
+
+    def __contains__(self, layer: object) -> bool:
+        return layer in self._targets
+
+    def __len__(self) -> int:
+        return len(self._targets)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._targets)
+
+    def num_polys(self, layer: str | None = None) -> int:
+        """
+        Count the polygons on a layer (or on all layers),
+        without transforming them.
+        """
+        return sum(
+            len(polys) for polys, _, target in self._pieces
+            if layer is None or target == layer
+            )
+
+    def num_vertices(self, layer: str | None = None) -> int:
+        """
+        Count the vertices on a layer (or on all layers),
+        without transforming them.
+        """
+        return sum(
+            polys.num_vertices for polys, _, target in self._pieces
+            if layer is None or target == layer
+            )
+
+    def materialize(self) -> 'rai.PackedGeoms':
+        """
+        Transform every layer and return them as a PackedGeoms.
+        The layers are shared with this view, so they are read-only.
+        """
+        missing = [
+            layer for layer in self._targets
+            if layer not in self._layers
+            ]
+        if missing:
+            assembled = _assemble(
+                self._pieces,
+                self.storage,
+                self.spill,
+                missing,
+                )
+            for layer, polys in assembled.items():
+                polys._freeze()
+                self._layers[layer] = polys
+
+        geoms = rai.PackedGeoms(storage=self.storage, spill=self.spill)
+        for layer in self._targets:
+            geoms[layer] = self._layers[layer]
+        return geoms
+
+    def copy(self) -> 'rai.PackedGeoms':
+        """
+        Transform every layer into a new, independent PackedGeoms.
+        """
+        return self.materialize().copy()
+
+    def __repr__(self) -> str:
+        return (
+            "<GeomsView: "
+            + ', '.join(
+                f"{layer} ({self.num_polys(layer)} polys)"
+                for layer in self._targets
+                )
+            + ">"
+            )
+
+def _write(
+        polys: 'rai.PackedPolys',
+        transform: 'rai.typing.Transform | None',
+        out: 'rai.PackedPolys',
+        vertex_start: int,
+        workspace: 'rai.affine.Workspace',
+        ) -> None:
+    """
+    Transform `polys` into `out`, starting at vertex `vertex_start`.
+    """
+    dbu = out.storage.dbu
+    same_storage = (
+        polys.storage.dbu == dbu
+        and polys.raw.dtype == out.raw.dtype
+        )
+
+    # In chunks, to avoid full-size temporaries
+    # (e.g. when `out` is spilled to disk)
+    for start in range(0, polys.num_vertices, rai.packed.SPILL_CHUNK):
+        stop = min(start + rai.packed.SPILL_CHUNK, polys.num_vertices)
+        target = out._vertices[vertex_start + start:vertex_start + stop]
+
+        if not same_storage:
+            vertices = polys._to_coords(polys.raw[start:stop])
+            if transform is not None:
+                vertices = transform.transform_xyarray(vertices)
+            target[:] = out._coerce(vertices)
+
+        elif transform is None:
+            target[:] = polys.raw[start:stop]
+
+        elif dbu is None:
+            transform.transform_xyarray(
+                polys.raw[start:stop],
+                out=target,
+                workspace=workspace,
+                )
+
+        else:
+            transform.transform_grid(
+                polys.raw[start:stop],
+                dbu,
+                out=target,
+                workspace=workspace,
+                )
+
+def _write_offsets(group: list) -> None:
+    """
+    Write the offsets of all placements of the same polys.
+    """
+    offsets = group[0][0].offsets[1:]
+    if len(group) == 1 or not len(offsets):
+        for _, _, out, vertex_start, poly_start in group:
+            out._offsets[poly_start + 1:poly_start + len(offsets) + 1] = \
+                offsets + vertex_start
+        return
+
+    starts: dict[int, tuple] = {}
+    for _, _, out, vertex_start, poly_start in group:
+        _, vertex_starts, poly_starts = starts.setdefault(
+            id(out),
+            (out, [], []),
+            )
+        vertex_starts.append(vertex_start)
+        poly_starts.append(poly_start)
+
+    poly_range = np.arange(1, len(offsets) + 1)
+    for out, vertex_starts, poly_starts in starts.values():
+        out._offsets[np.add.outer(poly_starts, poly_range)] = \
+            np.add.outer(vertex_starts, offsets)
+
+def _write_stacked(group: list) -> None:
+    """
+    Transform many placements of the same polys at once.
+    """
+    raw = group[0][0].raw
+    num_vertices = len(raw)
+    matrices = rai.Transform.stack(
+        rai.Transform() if transform is None else transform
+        for _, transform, _, _, _ in group
+        )
+    step = max(1, rai.packed.STACK_CHUNK // num_vertices)
+    for start in range(0, len(group), step):
+        stop = min(start + step, len(group))
+        transformed = rai.affine.transform_stack(matrices[start:stop], raw)
+
+        # Placements can go to different layers,
+        # and are scattered throughout them
+        for index in range(start, stop):
+            _, _, out, vertex_start, _ = group[index]
+            out._vertices[vertex_start:vertex_start + num_vertices] = \
+                transformed[index - start]
@@ -0,0 +1,177 @@
+"""
+hull.py
+Cached convex hulls of compo hierarchies.
+
+Every real compo can get the convex hull of everything in its hierarchy
+(in its own coordinates), computed from its own vertices
+and the hulls of its subcompos.
+Transforms are affine, so the hull of a transformed compo
+is just its transformed hull,
+and a compo's hull only needs the few hull points of each subcompo,
+never their full geometry.
+
+The exact bbox of a rotated compo is the bbox of its transformed hull,
+which is what bboxcache.py uses for rotated subcompos and proxies.
+
+Hulls are N x 2 arrays of points in counterclockwise order,
+starting from the lowest-leftmost point,
+without collinear points.
+Like the bboxes, the hull of a compo is checked against its `_version`,
+see dirty.py.
+"""
+
+import numpy as np
+
+import raimad as rai
+
+# Below this many points, filtering out interior points isn't worth it
+_FILTER_THRESHOLD = 64
+
+# Vectorized passes of `_chain()` before falling back to a stack
+_MAX_PASSES = 8
+
+def _turns(
+        points: np.typing.NDArray[np.float64],
+        ) -> np.typing.NDArray[np.bool_]:
+    """
+    Check which of the middle points of every three consecutive points
+    make a strict left (counterclockwise) turn.
+    """
+    a = points[:-2]
+    b = points[1:-1]
+    c = points[2:]
+    cross = (
+        (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1])
+        - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+        )
+    return cross > 0
+
+def _stack_chain(
+        points: np.typing.NDArray[np.float64],
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Get one half of the hull of sorted points,
+    going through them one by one with a stack.
+    """
+    chain: list[tuple[float, float]] = []
+    for x, y in points.tolist():
+        while len(chain) > 1:
+            ax, ay = chain[-2]
+            bx, by = chain[-1]
+            if (bx - ax) * (y - ay) - (by - ay) * (x - ax) > 0:
+                break
+            chain.pop()
+        chain.append((x, y))
+    return np.array(chain, dtype=np.float64).reshape(-1, 2)
+
+def _chain(
+        points: np.typing.NDArray[np.float64],
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Get one half of the hull of sorted points.
+
+    Instead of going through the points one by one with a stack,
+    this first drops every point that doesn't make a left turn
+    with its neighbours, all at once, until they all do.
+    A dropped point is never on the hull
+    (it's on or above the segment between two other points),
+    so any number of them can be dropped at once.
+    That usually takes a few passes, but can take as many passes
+    as there are points (e.g. along a concave arc),
+    so after `_MAX_PASSES` the rest goes through the stack.
+    """
+    for _ in range(_MAX_PASSES):
+        if len(points) <= 2:
+            return points
+        turns = _turns(points)
+        if turns.all():
+            return points
+        points = points[np.concatenate(([True], turns, [True]))]
+    return _stack_chain(points)
+
+def _filter(
+        points: np.typing.NDArray[np.float64],
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Drop points that are strictly inside the octagon
+    of the extreme points (Akl-Toussaint heuristic).
+    This leaves fewer points for the passes of `_chain()`.
+    """
+    xs = points[:, 0]
+    ys = points[:, 1]
+    octagon = points[[
+        np.argmin(xs),
+        np.argmin(xs + ys),
+        np.argmin(ys),
+        np.argmax(xs - ys),
+        np.argmax(xs),
+        np.argmax(xs + ys),
+        np.argmax(ys),
+        np.argmin(xs - ys),
+        ]]
+
+    # One row per edge, one column per point
+    starts = octagon[:, :, np.newaxis]
+    edges = np.roll(octagon, -1, axis=0)[:, :, np.newaxis] - starts
+    cross = (
+        edges[:, 0] * (ys - starts[:, 1])
+        - edges[:, 1] * (xs - starts[:, 0])
+        )
+    return points[~(cross > 0).all(axis=0)]
+
+def convex_hull(points: 'rai.typing.Poly') -> np.typing.NDArray[np.float64]:
+    """
+    Get the convex hull of some points,
+    with Andrew's monotone chain algorithm.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) > _FILTER_THRESHOLD:
+        points = _filter(points)
+
+    points = points[np.lexsort((points[:, 1], points[:, 0]))]
+    if len(points) > 1:
+        distinct = np.any(points[1:] != points[:-1], axis=1)
+        points = points[np.concatenate(([True], distinct))]
+    if len(points) < 3:
+        return points
+
+    lower = _chain(points)
+    upper = _chain(points[::-1])
+    return np.concatenate((lower[:-1], upper[:-1]))
+
+def _compute(
+        compo: 'rai.typing.RealCompo',
+        entries: dict,
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Compute the hull of a compo
+    from its geometry and the entries of its subcompos.
+    """
+    points = [polys.vertices for polys in compo.geoms.values()]
+    for proxy in compo.subcompos.values():
+        child, transform, _ = rai.flattener._enter(proxy, None, None)
+        hull = entries[id(child)][1].value
+        points.append(transform.transform_xyarray(hull))
+
+    if not points:
+        return np.empty((0, 2))
+    return convex_hull(np.concatenate(points))
+
+def compo_hull(
+        compo: 'rai.typing.RealCompo',
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Get the convex hull of everything
+    in the hierarchy of a real compo.
+    Don't modify the returned array, it's the cached one.
+    """
+    return rai.bboxcache._entry(compo, '_hull_entry', _compute).value
+
+def proxy_hull(
+        proxy: 'rai.typing.Proxy',
+        ) -> np.typing.NDArray[np.float64]:
+    """
+    Get the convex hull of everything
+    in the hierarchy of a proxy.
+    """
+    return proxy._flat()[1].transform_xyarray(compo_hull(proxy.final()))
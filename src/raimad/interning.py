@@ -0,0 +1,95 @@
+"""
+interning.py
+Sharing of identical geometry buffers.
+
+Designs that build the same shape many times
+(e.g. arrays of identical pixels)
+end up with many identical vertex buffers.
+An InternTable hands out one shared, read-only copy
+of each distinct buffer instead.
+"""
+
+import hashlib
+import weakref
+
+import numpy as np
+
+class InternTable:
+    """
+    InternTable: content-hashed table of shared read-only arrays.
+
+    The table only holds weak references,
+    so a buffer is dropped from the table once nothing uses it anymore.
+
+    Attributes
+    ----------
+    hits: int
+        Number of times an identical buffer was already in the table.
+    misses: int
+        Number of times a new buffer had to be added to the table.
+    bytes_saved: int
+        Total size of all the buffers that were replaced by a shared one.
+    """
+    _buffers: 'weakref.WeakValueDictionary[tuple, np.ndarray]'
+
+    def __init__(self) -> None:
+        self._buffers = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def intern(self, array: np.ndarray) -> np.ndarray:
+        """
+        Return the shared read-only array with the same contents as `array`.
+
+        If there is none yet, a compact read-only copy of `array`
+        is added to the table and returned.
+        """
+        array = np.ascontiguousarray(array)
+        key = (
+            array.dtype.str,
+            array.shape,
+            hashlib.blake2b(array.tobytes(), digest_size=16).digest(),
+            )
+
+        shared = self._buffers.get(key)
+        if shared is not None and np.array_equal(shared, array):
+            self.hits += 1
+            self.bytes_saved += array.nbytes
+            return shared
+
+        shared = array.copy()
+        shared.flags.writeable = False
+        self._buffers[key] = shared
+        self.misses += 1
+        return shared
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Total size of the shared buffers that are still alive.
+        """
+        return sum(array.nbytes for array in self._buffers.values())
+
+    def clear(self) -> None:
+        """
+        Forget all shared buffers and reset the counters.
+        Buffers that were already handed out stay shared.
+        """
+        self._buffers.clear()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+    def __repr__(self) -> str:
+        return (
+            f"<InternTable: {len(self)} buffers ({self.nbytes} bytes), "
+            f"{self.hits} hits, {self.misses} misses, "
+            f"{self.bytes_saved} bytes saved>"
+            )
+
+
+intern_table = InternTable()
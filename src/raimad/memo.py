@@ -0,0 +1,232 @@
+"""
+memo.py
+Memoized compo construction.
+
+Compo classes (and Partials) can opt in to a CompoCache.
+Constructing a compo with the same class and the same options
+(and the same storage settings, see storage.py)
+as an earlier one then returns the earlier compo instead of
+running `_make` again, so all proxies of it share one definition.
+
+Since cached compos are shared,
+they should not be modified after construction.
+"""
+
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Hashable
+import functools
+import hashlib
+import inspect
+import math
+
+import numpy as np
+
+import raimad as rai
+
+class UncacheableOptionError(TypeError):
+    """
+    UncacheableOptionError: an option value can't be used in a cache key.
+    Compos built with such options are simply not cached.
+    """
+
+def _normalize(value: Any) -> Hashable:
+    """
+    Turn an option value into something hashable that compares equal
+    exactly when the option values are equal.
+    """
+    if isinstance(value, (float, np.floating)):
+        # 0.0 and -0.0 compare equal, but aren't the same option
+        return (type(value).__name__, value, math.copysign(1, value))
+
+    if isinstance(value, (complex, np.complexfloating)):
+        return (
+            type(value).__name__,
+            value,
+            math.copysign(1, value.real),
+            math.copysign(1, value.imag),
+            )
+
+    if value is None or isinstance(
+            value,
+            (bool, int, str, bytes, Enum, np.generic, type)
+            ):
+        return (type(value).__name__, value)
+
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        return (
+            'ndarray',
+            array.dtype.str,
+            array.shape,
+            hashlib.blake2b(array.tobytes(), digest_size=16).digest(),
+            )
+
+    if isinstance(value, (list, tuple)):
+        return (
+            type(value).__name__,
+            tuple(_normalize(item) for item in value),
+            )
+
+    if isinstance(value, dict):
+        # Keys of different types can't be compared with each other,
+        # so sort by type and repr instead
+        items = sorted(
+            value.items(),
+            key=lambda item: (type(item[0]).__qualname__, repr(item[0])),
+            )
+        return ('dict', tuple(
+            (_normalize(key), _normalize(item)) for key, item in items
+            ))
+
+    if isinstance(value, (rai.Compo, rai.Partial)):
+        # Compos and partials compare by identity.
+        # Keeping the object itself in the key (and not just its id)
+        # also keeps it alive, so the id can't be reused.
+        return (type(value).__name__, value)
+
+    raise UncacheableOptionError(
+        f"Can't use {type(value).__name__} {value!r} in a compo cache key"
+        )
+
+@functools.cache
+def _make_signature(cls: 'rai.typing.CompoClass') -> inspect.Signature:
+    return inspect.signature(cls._make)
+
+class CompoCache:
+    """
+    CompoCache: LRU cache of constructed compos,
+    keyed by compo class and normalized option values.
+
+    Parameters
+    ----------
+    maxsize: int | None
+        Maximum number of compos to keep.
+        When full, the least recently used compo is evicted.
+        None means no limit.
+
+    Attributes
+    ----------
+    hits: int
+        Number of constructions that returned a cached compo.
+    misses: int
+        Number of constructions that had to run `_make`.
+    """
+    _compos: 'OrderedDict[Hashable, rai.typing.RealCompo]'
+
+    def __init__(self, maxsize: int | None = 128) -> None:
+        self.maxsize = maxsize
+        self._compos = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(
+            cls: 'rai.typing.CompoClass',
+            args: tuple,
+            kwargs: dict[str, Any],
+            ) -> Hashable | None:
+        """
+        Make the cache key for constructing `cls(*args, **kwargs)`,
+        or return None if the options can't be cached.
+        Options are bound to the signature of `_make`, so passing
+        an option positionally, by name, or leaving it at its default
+        value all give the same key.
+        The storage settings in effect (see storage.py) are part of the key,
+        since they change the geometry that `_make` stores.
+        """
+        if rai.is_compo_class(cls):
+            try:
+                bound = _make_signature(cls).bind(
+                    None,  # self
+                    *args,
+                    **kwargs,
+                    )
+            except TypeError:
+                # Wrong arguments, let `_make` complain about it.
+                return None
+            bound.apply_defaults()
+            options = list(bound.arguments.items())[1:]
+        else:
+            options = [*enumerate(args), *sorted(kwargs.items())]
+
+        try:
+            return (
+                cls,
+                tuple(vars(rai.get_storage()).items()),
+                _normalize(options),
+                )
+        except UncacheableOptionError:
+            return None
+
+    def get(
+            self,
+            cls: 'rai.typing.CompoClass',
+            args: tuple,
+            kwargs: dict[str, Any],
+            ) -> 'rai.typing.RealCompo | None':
+        """
+        Return the cached compo for these options, or None.
+        """
+        key = self.key(cls, args, kwargs)
+        compo = None if key is None else self._compos.get(key)
+
+        if compo is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._compos.move_to_end(key)
+        return compo
+
+    def put(
+            self,
+            cls: 'rai.typing.CompoClass',
+            args: tuple,
+            kwargs: dict[str, Any],
+            compo: 'rai.typing.RealCompo',
+            ) -> None:
+        """
+        Add a freshly constructed compo to the cache.
+        """
+        key = self.key(cls, args, kwargs)
+        if key is None:
+            return
+
+        self._compos[key] = compo
+        self._compos.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._compos) > self.maxsize:
+                self._compos.popitem(last=False)
+
+    def discard(
+            self,
+            cls: 'rai.typing.CompoClass',
+            args: tuple,
+            kwargs: dict[str, Any],
+            compo: 'rai.typing.RealCompo',
+            ) -> None:
+        """
+        Remove a compo from the cache, e.g. because its `_make` failed.
+        Does nothing if it isn't the compo cached for these options.
+        """
+        key = self.key(cls, args, kwargs)
+        if key is not None and self._compos.get(key) is compo:
+            del self._compos[key]
+
+    def clear(self) -> None:
+        """
+        Empty the cache and reset the counters.
+        """
+        self._compos.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._compos)
+
+    def __repr__(self) -> str:
+        return (
+            f"<CompoCache: {len(self)}/{self.maxsize} compos, "
+            f"{self.hits} hits, {self.misses} misses>"
+            )
@@ -0,0 +1,471 @@
+"""
+packed.py
+Contiguous storage for polygons.
+
+Instead of keeping each polygon as its own Python object,
+every layer keeps all of its vertices in one N x 2 buffer
+plus an array of offsets marking where each polygon starts.
+"""
+
+from typing import Any, Iterator, ItemsView, KeysView, ValuesView
+import os
+import tempfile
+import weakref
+
+try:
+    from typing import Self
+except ImportError:
+    # py3.10 and lower
+    from typing_extensions import Self
+
+import numpy as np
+
+import raimad as rai
+
+# Number of vertices transformed at a time when writing
+# to a spilled buffer, to avoid a full-size temporary in RAM
+SPILL_CHUNK = 1 << 20
+
+# Maximum number of vertices transformed at a time
+# when placing many copies of the same polys
+STACK_CHUNK = 1 << 16
+
+def _remove_spill_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        # Still mapped somewhere (Windows), or already gone.
+        pass
+
+class PackedPolys:
+    """
+    A list of polygons packed into one contiguous vertex buffer.
+
+    Polygon `i` is `vertices[offsets[i]:offsets[i + 1]]`.
+    Apart from that, this behaves like the list of polygons it replaces:
+    it can be indexed, iterated over, appended to and extended.
+    Indexing returns a view into the vertex buffer, not a copy
+    (except in database-unit mode, see below).
+
+    How the vertices are stored is decided by `storage`,
+    which defaults to the settings active at creation time.
+    If `storage.dbu` is set, the buffer holds int64 multiples of the
+    database unit (available as `raw`),
+    while `vertices`, indexing and iteration still give coordinates
+    in the usual units.
+
+    If `spill` is set and `storage.spill_dir` is not None,
+    the vertex buffer is a np.memmap backed by a scratch file
+    instead of living in RAM.
+    This is used for the output of `steamroll()`.
+
+    The buffers may be shared read-only arrays (see `intern()`);
+    they are copied before being modified.
+    Once frozen (see `Compo.freeze()`), the polys can't be modified at all.
+    """
+    storage: 'rai.Storage'
+
+    # The PackedGeoms holding these polys, see dirty.py
+    _parents: Any = None
+
+    def __init__(
+            self,
+            polys: 'rai.typing.Polys' = (),
+            storage: 'rai.Storage | None' = None,
+            spill: bool = False,
+            ) -> None:
+        self.storage = storage or rai.get_storage()
+        self._spill = spill and self.storage.spill_dir is not None
+        self._spill_path: str | None = None
+        self._vertices = np.empty((0, 2), dtype=self.storage.dtype)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._num_vertices = 0
+        self._num_polys = 0
+        self._frozen = False
+        self.extend(polys)
+
+    @classmethod
+    def from_buffers(
+            cls,
+            vertices: 'rai.typing.PolyArray',
+            offsets: np.typing.NDArray[np.int64],
+            storage: 'rai.Storage | None' = None,
+            ) -> Self:
+        """
+        Wrap an existing vertex buffer and offset array without copying.
+        In database-unit mode, `vertices` must already be in database units.
+        """
+        new = cls(storage=storage)
+        new._vertices = vertices
+        new._offsets = offsets
+        new._num_vertices = len(vertices)
+        new._num_polys = len(offsets) - 1
+        return new
+
+    @property
+    def raw(self) -> 'rai.typing.PolyArray':
+        """
+        The vertex buffer as stored:
+        floats normally, int64 database units in database-unit mode.
+        """
+        return self._vertices[:self._num_vertices]
+
+    @property
+    def vertices(self) -> 'rai.typing.PolyArray':
+        """
+        All vertices of all polygons as one N x 2 array.
+        """
+        return self._to_coords(self.raw)
+
+    def _to_coords(
+            self,
+            raw: 'rai.typing.PolyArray',
+            ) -> 'rai.typing.PolyArray':
+        if self.storage.dbu is None:
+            return raw
+        return raw * self.storage.dbu
+
+    @property
+    def offsets(self) -> np.typing.NDArray[np.int64]:
+        """
+        Start index of every polygon, plus the total number of vertices.
+        """
+        return self._offsets[:self._num_polys + 1]
+
+    @property
+    def num_vertices(self) -> int:
+        return self._num_vertices
+
+    def _reserve(self, num_vertices: int, num_polys: int) -> None:
+        """
+        Make room for this many more vertices and polygons.
+        Buffers grow geometrically, so appending is amortized O(1).
+        """
+        need = self._num_vertices + num_vertices
+        if need > len(self._vertices) or not self._vertices.flags.writeable:
+            capacity = max(need, 2 * len(self._vertices))
+            if self._spill:
+                self._vertices = self._grow_spill_file(capacity)
+            else:
+                grown = np.empty((capacity, 2), dtype=self._vertices.dtype)
+                grown[:self._num_vertices] = self.raw
+                self._vertices = grown
+
+        need = self._num_polys + num_polys + 1
+        if need > len(self._offsets) or not self._offsets.flags.writeable:
+            grown_offsets = np.empty(
+                max(need, 2 * len(self._offsets)),
+                dtype=np.int64,
+                )
+            grown_offsets[:self._num_polys + 1] = self.offsets
+            self._offsets = grown_offsets
+
+    def _grow_spill_file(self, capacity: int) -> np.memmap:
+        """
+        Grow the scratch file backing a spilled buffer and map it again.
+        The file is extended in place, so existing vertices are not copied.
+        """
+        dtype = np.dtype(self.storage.dtype)
+
+        if self._spill_path is None:
+            handle, self._spill_path = tempfile.mkstemp(
+                prefix='raimad-',
+                suffix='.vertices',
+                dir=self.storage.spill_dir,
+                )
+            os.close(handle)
+            weakref.finalize(self, _remove_spill_file, self._spill_path)
+
+        elif isinstance(self._vertices, np.memmap):
+            self._vertices.flush()
+
+        with open(self._spill_path, 'r+b') as file:
+            file.truncate(capacity * 2 * dtype.itemsize)
+
+        return np.memmap(
+            self._spill_path,
+            dtype=dtype,
+            mode='r+',
+            shape=(capacity, 2),
+            )
+
+    def _coerce(self, poly: 'rai.typing.Poly') -> 'rai.typing.PolyArray':
+        if self.storage.dbu is None:
+            array = np.asarray(poly, dtype=self.storage.precision)
+        else:
+            array = np.asarray(poly, dtype=np.float64)
+
+        if array.size == 0:
+            # Some compos (e.g. degenerate AnSecs) have empty polys
+            array = array.reshape(0, 2)
+
+        if self.storage.dbu is not None:
+            # Snap to the database unit grid
+            return np.rint(array / self.storage.dbu).astype(np.int64)
+        return array
+
+    def _check_frozen(self) -> None:
+        if self._frozen:
+            raise rai.err.FrozenError("Tried to modify frozen geometry")
+
+    def _modify(self) -> None:
+        """
+        Check that the polys may be modified,
+        and mark anything that depends on them dirty.
+        """
+        self._check_frozen()
+        if self._parents is not None:
+            rai.dirty.changed(self)
+
+    def _freeze(self) -> None:
+        """
+        Make the buffers read-only and forbid appending from now on.
+        """
+        self._vertices.flags.writeable = False
+        self._offsets.flags.writeable = False
+        self._frozen = True
+
+    def append(self, poly: 'rai.typing.Poly') -> None:
+        self._modify()
+        array = self._coerce(poly)
+        self._reserve(len(array), 1)
+
+        start = self._num_vertices
+        stop = start + len(array)
+        self._vertices[start:stop] = array
+        self._num_vertices = stop
+        self._num_polys += 1
+        self._offsets[self._num_polys] = stop
+
+    def extend(self, polys: 'rai.typing.Polys') -> None:
+        self._modify()
+        if not isinstance(polys, PackedPolys):
+            for poly in polys:
+                self.append(poly)
+            return
+
+        # Bulk copy, no need to go polygon-by-polygon
+        if polys.storage.dbu == self.storage.dbu:
+            incoming = polys.raw
+        else:
+            incoming = self._coerce(polys.vertices)
+
+        self._reserve(polys.num_vertices, len(polys))
+        start = self._num_vertices
+        stop = start + polys.num_vertices
+        self._vertices[start:stop] = incoming
+        self._offsets[self._num_polys + 1:self._num_polys + len(polys) + 1] = \
+            polys.offsets[1:] + start
+        self._num_vertices = stop
+        self._num_polys += len(polys)
+
+    def copy(self) -> Self:
+        """
+        Copy the polys into RAM.
+        """
+        return type(self).from_buffers(
+            np.array(self.raw),
+            np.array(self.offsets),
+            self.storage,
+            )
+
+    def intern(self, table: 'rai.InternTable | None' = None) -> None:
+        """
+        Replace the buffers with shared read-only ones from an InternTable
+        (`rai.intern_table` by default).
+        """
+        if table is None:
+            table = rai.intern_table
+        self._vertices = table.intern(self.raw)
+        self._offsets = table.intern(self.offsets)
+
+    def bboxes(self) -> np.typing.NDArray[np.float64]:
+        """
+        Get the bbox of every polygon at once,
+        as an N x 4 array of [min_x, min_y, max_x, max_y].
+        Empty polygons get [inf, inf, -inf, -inf].
+        """
+        bounds = np.tile(rai.bvh.EMPTY, (len(self), 1))
+        offsets = self.offsets
+        nonempty = np.flatnonzero(offsets[1:] > offsets[:-1])
+        if len(nonempty):
+            vertices = self.vertices
+            starts = offsets[nonempty]
+            bounds[nonempty, :2] = np.minimum.reduceat(vertices, starts)
+            bounds[nonempty, 2:] = np.maximum.reduceat(vertices, starts)
+        return bounds
+
+    def __len__(self) -> int:
+        return self._num_polys
+
+    def __getitem__(self, index: int | slice) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(self._num_polys)[index]]
+
+        if index < 0:
+            index += self._num_polys
+        if not 0 <= index < self._num_polys:
+            raise IndexError(f"Polygon index {index} out of range")
+
+        return self._to_coords(
+            self._vertices[self._offsets[index]:self._offsets[index + 1]]
+            )
+
+    def __iter__(self) -> Iterator['rai.typing.PolyArray']:
+        bounds = self.offsets.tolist()
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            yield self._to_coords(self._vertices[start:stop])
+
+    def __repr__(self) -> str:
+        return (
+            f"<PackedPolys: {len(self)} polys, "
+            f"{self.num_vertices} vertices>"
+            )
+
+class PackedGeoms:
+    """
+    A layer-keyed collection of PackedPolys.
+
+    This replaces the plain `dict[str, list[poly]]` that used to hold
+    compo geometry, and supports the same dict methods that compos
+    and exporters rely on.
+    Lists of polygons assigned to a layer are packed on the way in,
+    using `storage` (by default, the settings active at creation time).
+    New layers are spilled to disk if `spill` is set,
+    see PackedPolys.
+    """
+    _layers: dict[str, PackedPolys]
+    storage: 'rai.Storage'
+
+    # The compo holding these geoms, see dirty.py
+    _parents: Any = None
+    _version: int = 0
+
+    def __init__(
+            self,
+            layers: 'rai.typing.Geoms | None' = None,
+            storage: 'rai.Storage | None' = None,
+            spill: bool = False,
+            ) -> None:
+        self.storage = storage or rai.get_storage()
+        self.spill = spill
+        self._layers = {}
+        self._frozen = False
+        if layers is not None:
+            self.update(layers)
+
+    def __getitem__(self, layer: str) -> PackedPolys:
+        return self._layers[layer]
+
+    def __setitem__(self, layer: str, polys: 'rai.typing.Polys') -> None:
+        self._modify()
+        if not isinstance(polys, PackedPolys):
+            polys = PackedPolys(polys, self.storage, self.spill)
+        rai.dirty.add_parent(polys, self)
+        self._layers[layer] = polys
+
+    def __delitem__(self, layer: str) -> None:
+        self._modify()
+        del self._layers[layer]
+
+    def __contains__(self, layer: object) -> bool:
+        return layer in self._layers
+
+    def __len__(self) -> int:
+        return len(self._layers)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._layers)
+
+    def keys(self) -> KeysView[str]:
+        return self._layers.keys()
+
+    def values(self) -> ValuesView[PackedPolys]:
+        return self._layers.values()
+
+    def items(self) -> ItemsView[str, PackedPolys]:
+        return self._layers.items()
+
+    def get(self, layer: str, default: Any = None) -> Any:
+        return self._layers.get(layer, default)
+
+    def update(self, other: Any = (), **kwargs: 'rai.typing.Polys') -> None:
+        """
+        Set layers from a mapping or an iterable of (layer, polys) pairs,
+        and from keyword arguments, like `dict.update()`.
+        """
+        if hasattr(other, 'keys'):
+            other = [(layer, other[layer]) for layer in other.keys()]
+        for layer, polys in other:
+            self[layer] = polys
+        for layer, polys in kwargs.items():
+            self[layer] = polys
+
+    def setdefault(
+            self,
+            layer: str,
+            default: 'rai.typing.Polys | None' = None,
+            ) -> PackedPolys:
+        """
+        Get the polys on a layer, creating the layer if it doesn't exist,
+        with the polygons in `default` (none by default).
+        """
+        if layer not in self._layers:
+            self[layer] = [] if default is None else default
+        return self._layers[layer]
+
+    def clear(self) -> None:
+        """
+        Remove every layer.
+        """
+        self._modify()
+        self._layers.clear()
+
+    def _check_frozen(self) -> None:
+        if self._frozen:
+            raise rai.err.FrozenError("Tried to modify frozen geometry")
+
+    def _modify(self) -> None:
+        """
+        Check that the geoms may be modified,
+        and mark anything that depends on them dirty.
+        """
+        self._check_frozen()
+        if self._parents is not None:
+            rai.dirty.changed(self)
+
+    def _freeze(self) -> None:
+        """
+        Freeze every layer, and forbid adding or replacing layers.
+        """
+        for polys in self._layers.values():
+            polys._freeze()
+        self._frozen = True
+
+    def intern(self, table: 'rai.InternTable | None' = None) -> None:
+        """
+        Intern the buffers of every layer, see PackedPolys.intern().
+        """
+        for polys in self._layers.values():
+            polys.intern(table)
+
+    def copy(self) -> Self:
+        """
+        Copy the geoms, including the underlying buffers.
+        """
+        new = type(self)(storage=self.storage)
+        new._layers = {
+            layer: polys.copy()
+            for layer, polys in self._layers.items()
+            }
+        return new
+
+    def __repr__(self) -> str:
+        return (
+            "<PackedGeoms: "
+            + ', '.join(
+                f"{layer} ({len(polys)} polys)"
+                for layer, polys in self._layers.items()
+                )
+            + ">"
+            )
@@ -1,16 +1,41 @@
 from typing import Any
 from copy import copy
+
+try:
+    from typing import Self
+except ImportError:
+    # py3.10 and lower
+    from typing_extensions import Self
+
 import raimad as rai
 
 class Partial:
     compo_cls: 'rai.typing.CompoClass'
+    compo_cache: 'rai.CompoCache | None'
 
     def __init__(self, compo_cls: 'rai.typing.CompoClass', **kwargs: Any) -> None:
         self.kwargs = kwargs
         self.compo_cls = compo_cls
+        self.compo_cache = None
+
+    def memoize(self, cache: 'rai.CompoCache | None' = None) -> Self:
+        """
+        Reuse compos made by this partial when called with the same options.
+        This works even if the compo class itself doesn't have a cache.
+        """
+        self.compo_cache = rai.CompoCache() if cache is None else cache
+        return self
 
     def __call__(self, **kwargs: Any) -> 'rai.typing.RealCompo':
         kwargs2 = copy(self.kwargs)
         kwargs2.update(kwargs)
-        return self.compo_cls(**kwargs2)
+
+        if self.compo_cache is None:
+            return self.compo_cls(**kwargs2)
+
+        compo = self.compo_cache.get(self.compo_cls, (), kwargs2)
+        if compo is None:
+            compo = self.compo_cls(**kwargs2)
+            self.compo_cache.put(self.compo_cls, (), kwargs2, compo)
+        return compo
 
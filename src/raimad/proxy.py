@@ -1,4 +1,4 @@
-from typing import Iterator, Any
+from typing import Iterable, Iterator, Any
 
 try:
     from typing import Self
@@ -7,10 +7,13 @@ except ImportError:
     from typing_extensions import Self
 
 from copy import copy
+import weakref
 
 import raimad as rai
 
 class LMap:
+    __slots__ = ('shorthand', )
+
     def __init__(self, shorthand: 'rai.typing.LMapShorthand') -> None:
         self.shorthand = shorthand
 
@@ -28,7 +31,8 @@ class LMap:
     # TODO hacky
 
     def copy(self) -> Self:
-        return type(self)(self.shorthand)
+        # compose() modifies dict shorthands in-place
+        return type(self)(copy(self.shorthand))
 
     def compose(self, other: Self) -> Self:
         if other.shorthand is None:
@@ -59,7 +63,31 @@ class LMap:
 
         return self
 
+# Shared by all proxies that haven't been given a transform or lmap
+# of their own, see `Proxy.transform` and `Proxy.lmap`
+_IDENTITY_TRANSFORM = rai.Transform().freeze()
+_IDENTITY_LMAP = LMap(None)
+
 class Proxy:
+    # Big designs can have hundreds of thousands of proxies,
+    # so keep them compact.
+    # Proxies share one identity transform and lmap until they get
+    # their own, and everything cached for a proxy hangs off
+    # the one `_cache` slot, which stays None until something needs it,
+    # see `_flat()`.
+    __slots__ = (
+        'compo',
+        '_lmap',
+        '_transform',
+        '_cif_linked',
+        '_cif_link',
+        '_autogen',
+        '_frozen',
+        '_cache',
+        '_parents',
+        '__weakref__',
+        )
+
     compo: 'rai.typing.Compo'
 
     def __init__(self,
@@ -72,52 +100,246 @@ class Proxy:
         self._cif_linked = False
         self._cif_link = _cif_link
         self._autogen = _autogen
+        self._frozen = False
+        self._cache = None
+        self._parents = None
         self.compo = compo
-        self.lmap = LMap(lmap)
-        self.transform = transform or rai.Transform()
-
-    def steamroll(self) -> 'rai.typing.Geoms':
-        return {
-            self.lmap[layer]: [
-                self.transform.transform_xyarray(geom)
-                for geom in geoms
-                ]
-            for layer, geoms
-            in self.compo.steamroll().items()
-            }
+        self._lmap = _IDENTITY_LMAP if lmap is None else LMap(lmap)
+        self._transform = transform or _IDENTITY_TRANSFORM
+
+    @property
+    def transform(self) -> 'rai.typing.Transform':
+        transform = self._transform
+        if transform is _IDENTITY_TRANSFORM and not self._frozen:
+            transform = self._transform = rai.Transform()
+            # The transform holds the links from now on, see `_links()`
+            transform._parents = self._parents
+            self._parents = None
+        return transform
+
+    @transform.setter
+    def transform(self, transform: 'rai.typing.Transform') -> None:
+        parents = self._parents
+        if parents is not None and transform is not _IDENTITY_TRANSFORM:
+            # Hand the links over, like the getter does
+            self._parents = None
+            for ref in (
+                    (parents, ) if type(parents) is weakref.ref else parents
+                    ):
+                rai.dirty.add_parent(transform, ref)
+        self._transform = transform
+
+    @property
+    def lmap(self) -> LMap:
+        if self._lmap is _IDENTITY_LMAP:
+            self._lmap = LMap(None)
+        return self._lmap
+
+    @lmap.setter
+    def lmap(self, lmap: LMap) -> None:
+        self._lmap = lmap
+
+    def _copy_transform(self) -> 'rai.typing.Transform | None':
+        """
+        Copy the transform of this proxy for a new proxy,
+        or return None if it's the shared identity.
+        """
+        if self._transform is _IDENTITY_TRANSFORM:
+            return None
+        return self._transform.copy()
+
+    def _links(self) -> 'rai.typing.Proxy | rai.typing.Transform':
+        """
+        Get what the links to the containers holding this proxy
+        are kept on (see dirty.py): its transform,
+        or the proxy itself while it shares the identity transform.
+        """
+        if self._transform is _IDENTITY_TRANSFORM:
+            return self
+        return self._transform
+
+    def freeze(self) -> Self:
+        """
+        Make this proxy immutable: its transform and lmap can't be
+        changed anymore, and the compo it points to is frozen as well.
+        """
+        rai.compo._freeze(self)
+        return self
+
+    def _freeze_one(self) -> 'list[rai.typing.Compo]':
+        """
+        Freeze this proxy, but not the compo it points to,
+        and return that compo, see `rai.compo._freeze()`.
+        """
+        self._frozen = True
+        self._transform.freeze()
+        return [self.compo]
+
+    @property
+    def frozen(self) -> bool:
+        return self._frozen
+
+    def steamroll(
+            self,
+            layers: 'str | Iterable[str] | None' = None,
+            region: 'rai.typing.BBox | Iterable[float] | None' = None,
+            ) -> 'rai.PackedGeoms':
+        """
+        Steamroll the entire hierarchy under this proxy
+        into one PackedGeoms.
+        If `layers` is given, only those layers are steamrolled.
+        If `region` is given, only subcompos that overlap it are
+        steamrolled, see `rai.flatten_geoms()`.
+        """
+        return rai.flattener.flatten_geoms(self, layers, region)
+
+    def steamroll_view(
+            self,
+            layers: 'str | Iterable[str] | None' = None,
+            region: 'rai.typing.BBox | Iterable[float] | None' = None,
+            ) -> 'rai.GeomsView':
+        """
+        Like `steamroll()`, but return a read-only GeomsView
+        that only transforms a layer when it is accessed.
+        """
+        return rai.GeomsView(
+            rai.flattener._pieces(self, layers=layers, region=region),
+            self.final().geoms.storage,
+            spill=True,
+            )
+
+    def iter_steamroll(
+            self,
+            max_vertices: int = 1 << 20,
+            layers: 'str | Iterable[str] | None' = None,
+            region: 'rai.typing.BBox | Iterable[float] | None' = None,
+            ) -> 'Iterator[tuple[str, rai.PackedPolys]]':
+        """
+        Steamroll the hierarchy under this proxy in (layer, polys) batches
+        of at most `max_vertices` vertices,
+        without holding the whole flattened design in memory.
+        """
+        return rai.flattener.iter_geoms(self, max_vertices, layers, region)
+
+    def reachable_layers(self) -> frozenset[str]:
+        """
+        Get the layers that anything under this proxy ends up on.
+        """
+        return rai.flattener.reachable_layers(self)
+
+    def convex_hull(self) -> 'rai.typing.PolyArray':
+        """
+        Get the convex hull of everything under this proxy,
+        as an N x 2 array of points in counterclockwise order.
+        """
+        return rai.hull.proxy_hull(self)
+
+    def _flat(self) -> list:
+        """
+        Get the flat transform and lmap of this proxy
+        (everything from the real compo up to this proxy, combined)
+        as a list of [stamp, transform, lmap, inverse transform,
+        geoms view, bbox], where the last three are None
+        until they're needed.
+
+        This is cached. The cache is checked against the transform
+        revisions and lmaps of every proxy in the chain,
+        so changing any of them (`move`, `rotate`, `map`,
+        `BoundPoint.to`, ...) means it's recomputed on the next call.
+        """
+        chain = []
+        stamp: tuple = ()
+        proxy = self
+        while isinstance(proxy, Proxy):
+            chain.append(proxy)
+            transform = proxy._transform
+            stamp += (transform, transform._revision, proxy._lmap)
+            proxy = proxy.compo
+
+        cache = self._cache
+        if cache is not None and cache[0] == stamp:
+            return cache
+
+        # Innermost proxy first
+        transform = chain[-1]._transform.copy()
+        lmap = chain[-1]._lmap.copy()
+        for proxy in reversed(chain[:-1]):
+            transform.compose(proxy._transform)
+            lmap.compose(proxy._lmap)
+
+        self._cache = [stamp, transform, lmap, None, None, None]
+        return self._cache
 
     def get_flat_transform(self, maxdepth: int = -1) -> 'rai.typing.Transform':
-        if maxdepth == 0 or isinstance(self.compo, rai.Compo):
-            return self.transform.copy()
+        """
+        Get the transform that maps the geometry of the real compo
+        to this proxy, going through at most `maxdepth` levels
+        of proxies (all of them by default).
+        """
+        if maxdepth < 0:
+            return self._flat()[1].copy()
 
-        #return (
-        #    self.compo.get_flat_transform(maxdepth - 1)
-        #    .compose(self.transform)
-        #    )
+        if maxdepth == 0 or isinstance(self.compo, rai.Compo):
+            return self._transform.copy()
 
-        # TODO huh? copy?
-        return self.transform.copy().compose(
+        return (
             self.compo.get_flat_transform(maxdepth - 1)
+            .compose(self._transform)
             )
 
+    def get_flat_inverse(self) -> 'rai.typing.Transform':
+        """
+        Get the inverse of the flat transform,
+        which maps this proxy's coordinates to those of the real compo.
+        """
+        cache = self._flat()
+        if cache[3] is None:
+            cache[3] = cache[1].copy().inverse()
+        return cache[3].copy()
+
     def get_flat_lmap(self, maxdepth: int = -1) -> LMap:
+        """
+        Get the lmap that maps the layers of the real compo
+        to this proxy, going through at most `maxdepth` levels
+        of proxies (all of them by default).
+        """
+        if maxdepth < 0:
+            return self._flat()[2].copy()
+
         if maxdepth == 0 or isinstance(self.compo, rai.Compo):
-            return self.lmap.copy()
+            return self._lmap.copy()
 
-        return self.lmap.copy().compose(
-            self.compo.get_flat_lmap(maxdepth - 1)
-            )
+        return self.compo.get_flat_lmap(maxdepth - 1).compose(self._lmap)
 
     @property
-    def geoms(self) -> 'rai.typing.Geoms':
-        return {
-            self.lmap[layer]: [
-                self.transform.transform_xyarray(geom)
-                for geom in geoms
-                ]
-            for layer, geoms
-            in self.compo.geoms.items()
-            }
+    def geoms(self) -> 'rai.GeomsView':
+        """
+        Get the geometry of the real compo, as seen through this proxy.
+
+        The view is kept until the flat transform or lmap changes,
+        or until the `_version` of the real compo changes
+        (see dirty.py), so accessing this repeatedly doesn't
+        transform anything again.
+        Editing vertex arrays in place isn't tracked,
+        use the methods of PackedPolys instead.
+        """
+        flat = self._flat()
+        compo = self.final()
+        geoms = compo.geoms
+
+        cache = flat[4]
+        if cache is not None and cache[0] == compo._version:
+            return cache[1]
+
+        view = rai.GeomsView(
+            [
+                (polys, flat[1], flat[2][layer])
+                for layer, polys in geoms.items()
+                ],
+            geoms.storage,
+            )
+        flat[4] = (compo._version, view)
+        return view
 
     @property
     def subcompos(self) -> rai.SubcompoContainer:
@@ -156,8 +378,8 @@ class Proxy:
 
         return type(self)(
             self.compo,
-            self.lmap.shorthand,
-            self.transform.copy(),
+            self._lmap.shorthand,
+            self._copy_transform(),
             )
 
     #def cifcopy(self):
@@ -182,8 +404,8 @@ class Proxy:
 
         return type(self)(
             new_subcompo,
-            self.lmap.shorthand,
-            self.transform.copy(),
+            self._lmap.shorthand,
+            self._copy_transform(),
             _autogen=_autogen,
             )
 
@@ -263,31 +485,33 @@ class Proxy:
     #    #    lmap=lmap
     #    #    )
     def map(self, lmap_shorthand: 'rai.typing.LMapShorthand') -> Self:
+        if self._frozen:
+            raise rai.err.FrozenError("Tried to change lmap of frozen proxy")
         self.lmap = LMap(lmap_shorthand)
+        rai.dirty.changed(self._links())
         return self
 
     # mark functions #
     def get_mark(self, name: str) -> rai.BoundPoint:
         return rai.BoundPoint(
-            self.transform.transform_point(
-                self.compo.get_mark(name)
+            self._flat()[1].transform_point(
+                self.final().get_mark(name)
                 ),
             self
             )
 
     @property
     def marks(self) -> rai.MarksContainer:
-        return self.compo.marks._proxy_copy(self)
+        return self.final().marks._proxy_copy(self)
 
     # bbox functions #
     # TODO same as compo -- some sort of reuse?
     @property
     def bbox(self) -> 'rai.typing.BBox':
-        bbox = rai.BBox(proxy=self)
-        for geoms in self.steamroll().values():
-            for geom in geoms:
-                bbox.add_xyarray(geom)
-        return bbox
+        return rai.BBox.from_bounds(
+            rai.bboxcache.proxy_bounds(self),
+            proxy=self,
+            )
 
     # snapping functions #
     def snap_left(self, other: Self) -> Self:
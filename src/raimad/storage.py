@@ -0,0 +1,128 @@
+"""
+storage.py
+Settings that control how compo geometry is stored.
+
+Geometry containers pick up whatever settings are active
+when they are created, so the settings apply per-design:
+
+    with rai.storage(dbu=1e-3):
+        chip = MyChip()
+
+Everything built inside the `with` block (and everything
+steamrolled from it later) uses the settings from the block.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+import numpy as np
+
+import raimad as rai
+
+class Storage:
+    """
+    Storage: how compo geometry is stored.
+
+    Parameters
+    ----------
+    dbu: float | None
+        Size of one database unit, in the same units as the geometry.
+        When set, coordinates are snapped to this grid as they are stored,
+        and kept as int64 multiples of it.
+        When None (the default), coordinates are stored as floats.
+    precision: type
+        Float type used for storing coordinates when `dbu` is not set.
+        This is np.float64 by default.
+        np.float32 halves memory use and bandwidth,
+        which is handy for previews and density analysis,
+        but it only has about 7 significant digits,
+        so it can't resolve sub-micron features across a whole die.
+    spill_dir: str | Path | None
+        Scratch directory for out-of-core flattening.
+        When set, the layer buffers produced by `steamroll()`
+        are written to memory-mapped files in this directory
+        instead of being kept in RAM.
+        The files are deleted once the buffers are garbage collected.
+        Compo geometry itself is never spilled.
+    intern: bool | InternTable
+        Whether compo geometry should be interned once `_make` returns,
+        so that compos with identical geometry share the same read-only
+        buffers. Pass an InternTable to use it instead of the
+        default `rai.intern_table`.
+    """
+
+    def __init__(
+            self,
+            dbu: float | None = None,
+            precision: type = np.float64,
+            spill_dir: str | Path | None = None,
+            intern: 'bool | rai.InternTable' = False,
+            ) -> None:
+        self.dbu = dbu
+        self.precision = precision
+        self.spill_dir = spill_dir
+        self.intern = intern
+
+    @property
+    def intern_table(self) -> 'rai.InternTable | None':
+        """
+        The InternTable to use, or None if interning is off.
+        """
+        if self.intern is True:
+            return rai.intern_table
+        if self.intern is False:
+            return None
+        return self.intern
+
+    @property
+    def dtype(self) -> type:
+        """
+        dtype of the stored vertex buffers.
+        """
+        if self.dbu is not None:
+            return np.int64
+        return self.precision
+
+    def replace(self, **kwargs: Any) -> 'Storage':
+        """
+        Copy these settings, changing some of them.
+        """
+        settings = dict(vars(self))
+        settings.update(kwargs)
+        return type(self)(**settings)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Storage):
+            return NotImplemented
+        return vars(self) == vars(other)
+
+    def __repr__(self) -> str:
+        return (
+            "<Storage "
+            + ' '.join(f'{key}={val}' for key, val in vars(self).items())
+            + ">"
+            )
+
+
+_storage = Storage()
+
+def get_storage() -> Storage:
+    """
+    Get the storage settings that are currently in effect.
+    """
+    return _storage
+
+@contextmanager
+def storage(**kwargs: Any) -> Iterator[Storage]:
+    """
+    Change the storage settings for geometry created inside a `with` block.
+    Any setting not given is inherited from the enclosing settings.
+    """
+    global _storage
+    previous = _storage
+    _storage = previous.replace(**kwargs)
+    try:
+        yield _storage
+    finally:
+        _storage = previous
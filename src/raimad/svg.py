@@ -1,8 +1,23 @@
-
-def export_svg(compo: 'rai.typing.Compo') -> str:
-    return ''.join(yield_svg(compo))
-
-def yield_svg(compo):
+from typing import Iterable
+
+import raimad as rai
+
+def export_svg(
+        compo: 'rai.typing.Compo',
+        layers: 'str | Iterable[str] | None' = None,
+        region: 'rai.typing.BBox | Iterable[float] | None' = None,
+        ) -> str:
+    return ''.join(yield_svg(compo, layers, region))
+
+def yield_svg(compo, layers=None, region=None):
+    """
+    Yield pieces of an SVG drawing of a compo,
+    or of only some of its (top-level) layers,
+    or of only the subcompos near some region.
+    The drawing is always framed by the bbox of the whole compo
+    (which is cached), so the design is only walked once,
+    and filtered drawings line up with the full one.
+    """
     bbox = compo.bbox.pad(10)
 
     yield (
@@ -16,7 +31,17 @@ def yield_svg(compo):
         '<g transform="scale(1,-1)">\n'
         )
 
-    for layer_name, layer_geoms in compo.steamroll().items():
+    # Draw one layer at a time, in the same order as `steamroll()`,
+    # so only one layer is ever held in memory
+    pieces = rai.flattener._pieces(compo, layers=layers, region=region)
+    storage = compo.final().geoms.storage
+    for layer_name in dict.fromkeys(target for _, _, target in pieces):
+        layer_geoms = rai.flattener._assemble(
+            pieces,
+            storage,
+            spill=True,
+            layers=(layer_name, ),
+            )[layer_name]
         for geom in layer_geoms:
             yield (
                 '<polygon '
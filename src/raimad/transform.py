@@ -1,73 +1,450 @@
-from copy import deepcopy
-
 try:
     from typing import Self
 except ImportError:
     # py3.10 and lower
     from typing_extensions import Self
 
+from enum import Enum
+from typing import Iterable, NamedTuple
+import functools
+import math
+
 import numpy as np
 import raimad as rai
 
+class TransformKind(Enum):
+    """
+    What sort of transform a Transform is.
+    Transforms are applied with the cheapest kernel for their kind.
+    """
+    IDENTITY = 0
+    TRANSLATION = 1
+    # Any combination of 90 degree rotations, mirrors,
+    # uniform magnification, and translation.
+    MANHATTAN = 2
+    GENERAL = 3
+
+class Decomposition(NamedTuple):
+    """
+    A transform split up into
+    mirroring across the x axis, then rotation by `angle`,
+    then magnification, then translation by `offset`.
+    """
+    magnification: float
+    angle: float
+    mirror: bool
+    offset: tuple[float, float]
+
+def _classify(
+        xx: float,
+        xy: float,
+        yx: float,
+        yy: float,
+        dx: float,
+        dy: float,
+        ) -> TransformKind:
+    """
+    Classify a transform by its coefficients, see `Transform.kind`.
+    """
+    if xx == 1 and xy == 0 and yx == 0 and yy == 1:
+        if dx == 0 and dy == 0:
+            return TransformKind.IDENTITY
+        return TransformKind.TRANSLATION
+
+    if (
+            (xy == 0 and yx == 0 and abs(xx) == abs(yy) != 0)
+            or (xx == 0 and yy == 0 and abs(xy) == abs(yx) != 0)
+            ):
+        return TransformKind.MANHATTAN
+
+    return TransformKind.GENERAL
+
+@functools.lru_cache(maxsize=1024)
+def _decompose_linear(
+        xx: float,
+        xy: float,
+        yx: float,
+        yy: float,
+        ) -> tuple[float, float, bool] | None:
+    """
+    Get the magnification, angle and mirroring of the linear part
+    of a transform, see `Transform.decompose()`.
+    Cached here instead of on each transform, since most transforms
+    in a design share a handful of linear parts.
+    """
+    mirror = xx * yy - xy * yx < 0
+    magnification = math.hypot(xx, yx)
+
+    if _classify(xx, xy, yx, yy, 0, 0) is not TransformKind.GENERAL:
+        # Exactly one of xx, yx is nonzero
+        if xx:
+            magnification = abs(xx)
+            angle = 0.0 if xx > 0 else math.pi
+        else:
+            magnification = abs(yx)
+            angle = math.pi / 2 if yx > 0 else math.pi * 3 / 2
+        return magnification, angle, mirror
+
+    # The second column must be the first one turned by +-90 degrees
+    sign = -1 if mirror else 1
+    if not (
+            math.isclose(xy, -yx * sign, rel_tol=1e-12, abs_tol=1e-15)
+            and math.isclose(yy, xx * sign, rel_tol=1e-12, abs_tol=1e-15)
+            ):
+        return None
+
+    angle = math.atan2(yx, xx) % (2 * math.pi)
+    return magnification, angle, mirror
+
+# cos and sin of n quarter turns
+_QUARTER_TURNS = ((1.0, 0.0), (0.0, 1.0), (-1.0, 0.0), (0.0, -1.0))
+
 class Transform:
     """
     Transformation: container for affine matrix
-    """
 
-    _affine: 'rai.typing.Affine'
+    The six coefficients of the affine matrix
+    [[xx, xy, dx], [yx, yy, dy], [0, 0, 1]]
+    are stored as plain floats,
+    and operations are folded into them directly.
+    An actual matrix is only built when needed.
+    """
+    __slots__ = (
+        '_xx', '_xy', '_dx',
+        '_yx', '_yy', '_dy',
+        '_frozen',
+        '_revision',
+        '_parents',
+        )
+
+    _xx: float
+    _xy: float
+    _dx: float
+    _yx: float
+    _yy: float
+    _dy: float
 
     def __init__(self) -> None:
+        self._frozen = False
+        self._revision = 0
+        self._parents = None
         self.reset()
 
     def reset(self) -> None:
-        self._affine = np.identity(3)
+        self._modify()
+        self._xx, self._xy, self._dx = 1.0, 0.0, 0.0
+        self._yx, self._yy, self._dy = 0.0, 1.0, 0.0
+
+    @property
+    def _affine(self) -> 'rai.typing.Affine':
+        return np.array([
+            [self._xx, self._xy, self._dx],
+            [self._yx, self._yy, self._dy],
+            [0.0, 0.0, 1.0],
+            ])
+
+    def _check_frozen(self) -> None:
+        if self._frozen:
+            raise rai.err.FrozenError(
+                "Tried to modify the transform of a frozen proxy"
+                )
+
+    def _modify(self) -> None:
+        """
+        Check that this transform may be modified,
+        and bump its revision, so that anything cached from it
+        (e.g. flat transforms of proxies) is recomputed.
+        The subcompo containers holding its proxy are marked dirty,
+        see dirty.py.
+        """
+        self._check_frozen()
+        self._revision += 1
+        if self._parents is not None:
+            rai.dirty.changed(self)
+
+    def _premultiply(
+            self,
+            xx: float,
+            xy: float,
+            dx: float,
+            yx: float,
+            yy: float,
+            dy: float,
+            ) -> None:
+        """
+        Apply an affine matrix (given by its six coefficients)
+        after this transform
+        """
+        self._modify()
+        self._xx, self._xy, self._dx, self._yx, self._yy, self._dy = (
+            xx * self._xx + xy * self._yx,
+            xx * self._xy + xy * self._yy,
+            xx * self._dx + xy * self._dy + dx,
+            yx * self._xx + yy * self._yx,
+            yx * self._xy + yy * self._yy,
+            yx * self._dx + yy * self._dy + dy,
+            )
+
+    def _premultiply_around(
+            self,
+            xx: float,
+            xy: float,
+            yx: float,
+            yy: float,
+            x: float,
+            y: float,
+            ) -> None:
+        """
+        Apply a linear map around point (x, y) after this transform
+        """
+        x = float(x)
+        y = float(y)
+        self._premultiply(
+            xx, xy, x - xx * x - xy * y,
+            yx, yy, y - yx * x - yy * y,
+            )
+
+    @staticmethod
+    def stack(
+            transforms: 'Iterable[Transform]',
+            ) -> np.typing.NDArray[np.float64]:
+        """
+        Stack the affine matrices of some transforms
+        into one N x 3 x 3 array, e.g. for `rai.affine.transform_stack()`.
+        """
+        coefficients = np.array(
+            [
+                (
+                    transform._xx, transform._xy, transform._dx,
+                    transform._yx, transform._yy, transform._dy,
+                    )
+                for transform in transforms
+                ],
+            dtype=np.float64,
+            ).reshape(-1, 2, 3)
+
+        matrices = np.zeros((len(coefficients), 3, 3))
+        matrices[:, :2] = coefficients
+        matrices[:, 2, 2] = 1
+        return matrices
+
+    @property
+    def kind(self) -> TransformKind:
+        """
+        Classify this transform.
+        This is a few comparisons, so it isn't cached,
+        which keeps transforms (one per proxy) small.
+        """
+        # Same as _classify(), inlined: this is on the bbox hot path
+        xx = self._xx
+        xy = self._xy
+        yx = self._yx
+        yy = self._yy
+        if xx == 1 and xy == 0 and yx == 0 and yy == 1:
+            if self._dx == 0 and self._dy == 0:
+                return TransformKind.IDENTITY
+            return TransformKind.TRANSLATION
+
+        if (
+                (xy == 0 and yx == 0 and abs(xx) == abs(yy) != 0)
+                or (xx == 0 and yy == 0 and abs(xy) == abs(yx) != 0)
+                ):
+            return TransformKind.MANHATTAN
+
+        return TransformKind.GENERAL
+
+    def decompose(self) -> Decomposition | None:
+        """
+        Split this transform up into magnification, rotation, mirroring,
+        and translation.
+        Return None if that's impossible
+        (i.e. the transform shears or scales non-uniformly).
+        The decomposition of Manhattan transforms is exact.
+        """
+        linear = _decompose_linear(self._xx, self._xy, self._yx, self._yy)
+        if linear is None:
+            return None
+        return Decomposition(*linear, (self._dx, self._dy))
+
+    def freeze(self) -> Self:
+        """
+        Make this transform immutable.
+        Copies of a frozen transform are not frozen.
+        """
+        self._frozen = True
+        return self
 
     def transform_xyarray(
             self,
-            poly: 'rai.typing.Poly | pc.typing.PolyArray'
+            poly: 'rai.typing.Poly | pc.typing.PolyArray',
+            out: np.ndarray | None = None,
+            workspace: 'rai.affine.Workspace | None' = None,
             ) -> 'rai.typing.Poly | pc.typing.PolyArray':
         """
-        Apply transformation to xyarray and return new transformed xyarray
+        Apply transformation to xyarray and return new transformed xyarray.
+        If `out` is given, the result is written there instead
+        (`out` may be `poly` itself).
+        Temporaries, if any, come from `workspace`.
         """
-        return rai.affine.transform_xyarray(self._affine, poly)
+        kind = self.kind
+
+        if len(poly) == 0:
+            return poly if out is None else out
+
+        xyarray = rai.affine.as_xyarray(poly)
+
+        if kind is TransformKind.GENERAL:
+            return rai.affine.general_xyarray(
+                xyarray,
+                self._xx, self._xy, self._yx, self._yy,
+                self._dx, self._dy,
+                out=out,
+                workspace=workspace,
+                )
+
+        if kind is TransformKind.IDENTITY:
+            if out is None:
+                return xyarray.copy()
+            np.copyto(out, xyarray)
+            return out
+
+        if kind is TransformKind.TRANSLATION:
+            return rai.affine.translate_xyarray(
+                xyarray,
+                self._dx,
+                self._dy,
+                out=out,
+                workspace=workspace,
+                )
+
+        return rai.affine.manhattan_xyarray(
+            xyarray,
+            self._xx, self._xy, self._yx, self._yy,
+            self._dx, self._dy,
+            out=out,
+            workspace=workspace,
+            )
+
+    def transform_grid(
+            self,
+            grid: np.typing.NDArray[np.int64],
+            dbu: float,
+            out: np.typing.NDArray[np.int64] | None = None,
+            workspace: 'rai.affine.Workspace | None' = None,
+            ) -> np.typing.NDArray[np.int64]:
+        """
+        Apply transformation to int64 database-unit coordinates
+        and return new database-unit coordinates.
+        If `out` is given, the result is written there instead.
+        Temporaries, if any, come from `workspace`.
+        """
+        kind = self.kind
+
+        if kind is TransformKind.IDENTITY:
+            if out is None:
+                return grid.copy()
+            np.copyto(out, grid)
+            return out
+
+        if kind is not TransformKind.GENERAL:
+            # Exact integer arithmetic, as long as the transform
+            # maps the grid onto itself
+            decomposition = self.decompose()
+            offset_x = self._dx / dbu
+            offset_y = self._dy / dbu
+            grid_x = round(offset_x)
+            grid_y = round(offset_y)
+            if (
+                    decomposition.magnification == 1
+                    and abs(offset_x - grid_x) < 1e-6
+                    and abs(offset_y - grid_y) < 1e-6
+                    ):
+                if kind is TransformKind.TRANSLATION:
+                    return rai.affine.translate_xyarray(
+                        grid,
+                        grid_x,
+                        grid_y,
+                        out=out,
+                        workspace=workspace,
+                        )
+
+                return rai.affine.manhattan_xyarray(
+                    grid,
+                    int(self._xx), int(self._xy), int(self._yx), int(self._yy),
+                    grid_x, grid_y,
+                    out=out,
+                    workspace=workspace,
+                    )
+
+        # Anything else goes through floating point
+        # and gets snapped back to the grid
+        workspace = workspace or rai.affine.Workspace()
+        scratch = workspace.get((len(grid), 2), np.float64, 3)
+        np.multiply(grid, dbu, out=scratch)
+        self.transform_xyarray(scratch, out=scratch, workspace=workspace)
+        np.divide(scratch, dbu, out=scratch)
+        np.rint(scratch, out=scratch)
+        if out is None:
+            return scratch.astype(np.int64)
+        np.copyto(out, scratch, casting='unsafe')
+        return out
 
     def transform_point(self, point: 'rai.typing.Point') -> 'pc.typing.Point':
         """
         Apply transformation to point and return new transformed point
         """
-        return rai.affine.transform_point(self._affine, point)
+        x, y = point
+        return np.array([
+            self._xx * x + self._xy * y + self._dx,
+            self._yx * x + self._yy * y + self._dy,
+            ])
 
     def compose(self, transform: Self) -> Self:
         """
         Apply a transform to this transform
         """
         if transform is not None:
-            self._affine = transform._affine @ self._affine
+            self._premultiply(
+                transform._xx, transform._xy, transform._dx,
+                transform._yx, transform._yy, transform._dy,
+                )
         return self
 
     def get_translation(self) -> np.typing.NDArray[np.float64]:
-        return rai.affine.get_translation(self._affine)
+        return np.array([self._dx, self._dy])
 
     def get_rotation(self) -> float:
-        return rai.affine.get_rotation(self._affine)
+        return math.atan2(self._yx, self._xx)
 
     def get_shear(self) -> float:
-        return rai.affine.get_shear(self._affine)
+        scale_x, scale_y = self.get_scale()
+        return (
+            (self._xx * self._xy + self._yx * self._yy)
+            / (scale_x * scale_y)
+            )
 
-    def get_scale(self) -> tuple[np.float64, np.float64]:
-        return rai.affine.get_scale(self._affine)
+    def get_scale(self) -> tuple[float, float]:
+        return math.hypot(self._xx, self._yx), math.hypot(self._xy, self._yy)
 
     def does_translate(self) -> bool:
-        norm = np.linalg.norm(self.get_translation())
+        if self.kind is TransformKind.IDENTITY:
+            return False
+        norm = math.hypot(self._dx, self._dy)
         return norm > 0.001  # TODO epsilon
 
     def does_rotate(self) -> 'rai.typing.Bool':
+        if self.kind in (TransformKind.IDENTITY, TransformKind.TRANSLATION):
+            return False
         return abs(self.get_rotation()) > 0.001  # TODO epsilon
 
     def does_shear(self) -> 'rai.typing.Bool':
+        if self.kind in (TransformKind.IDENTITY, TransformKind.TRANSLATION):
+            return False
         return abs(self.get_shear()) > 0.001  # TODO epsilon
 
     def does_scale(self) -> 'rai.typing.Bool':
+        if self.kind in (TransformKind.IDENTITY, TransformKind.TRANSLATION):
+            return False
         scale_x, scale_y = self.get_scale()
         # TODO epsilon
         return abs(1 - scale_x) > 0.001 or abs(1 - scale_y) > 0.001
@@ -101,7 +478,13 @@ class Transform:
             ))
 
     def copy(self) -> Self:
-        return deepcopy(self)
+        new = type(self).__new__(type(self))
+        new._xx, new._xy, new._dx = self._xx, self._xy, self._dx
+        new._yx, new._yy, new._dy = self._yx, self._yy, self._dy
+        new._frozen = False
+        new._revision = 0
+        new._parents = None
+        return new
 
     # TODO typing.point
     # types defined in own files
@@ -110,15 +493,21 @@ class Transform:
     def move(self, x=0, y: float = 0):
         if isinstance(x, rai.Point):
             x, y = x
-        self._affine = rai.affine.move(x, y) @ self._affine
+        self._modify()
+        # float() so that numpy scalars (e.g. from marks)
+        # don't turn the coefficients into numpy scalars
+        self._dx += float(x)
+        self._dy += float(y)
         return self
 
     def movex(self, x: float = 0) -> Self:
-        self._affine = rai.affine.move(x, 0) @ self._affine
+        self._modify()
+        self._dx += float(x)
         return self
 
     def movey(self, y: float = 0) -> Self:
-        self._affine = rai.affine.move(0, y) @ self._affine
+        self._modify()
+        self._dy += float(y)
         return self
 
     #def scale(
@@ -140,7 +529,7 @@ class Transform:
     def scale(self, x: float, y: float | None = None) -> Self:
         if y is None:
             y = x
-        self._affine = rai.affine.scale(x, y) @ self._affine
+        self._premultiply(float(x), 0.0, 0.0, 0.0, float(y), 0.0)
         return self
 
     def rotate(
@@ -153,23 +542,39 @@ class Transform:
         if isinstance(x, rai.Point):
             x, y = x
 
-        self._affine = rai.affine.around(rai.affine.rotate(angle), x, y) @ self._affine
+        quarter_turns = angle / (math.pi / 2)
+        if abs(quarter_turns - round(quarter_turns)) < 1e-12:
+            # Keep 90 degree rotations exact
+            cos, sin = _QUARTER_TURNS[round(quarter_turns) % 4]
+        else:
+            cos = math.cos(angle)
+            sin = math.sin(angle)
+        self._premultiply_around(cos, -sin, sin, cos, x, y)
 
         return self
 
     def hflip(self, x: float = 0) -> Self:
-        self._affine = rai.affine.around(rai.affine.scale(1, -1), 0, x) @ self._affine
+        self._premultiply_around(1.0, 0.0, 0.0, -1.0, 0, x)
         return self
 
     def vflip(self, y: float = 0) -> Self:
-        self._affine = rai.affine.around(rai.affine.scale(-1, 1), y, 0) @ self._affine
+        self._premultiply_around(-1.0, 0.0, 0.0, 1.0, y, 0)
         return self
 
     def flip(self, x: float = 0, y: float = 0) -> Self:
-        self._affine = rai.affine.around(rai.affine.scale(-1, -1), x, y) @ self._affine
+        self._premultiply_around(-1.0, 0.0, 0.0, -1.0, x, y)
         return self
 
     def inverse(self):
-        self._affine = np.linalg.inv(self._affine)
+        self._modify()
+        det = self._xx * self._yy - self._xy * self._yx
+        if det == 0:
+            raise np.linalg.LinAlgError("Singular matrix")
+        xx, xy = self._yy / det, -self._xy / det
+        yx, yy = -self._yx / det, self._xx / det
+        self._xx, self._xy, self._dx, self._yx, self._yy, self._dy = (
+            xx, xy, -xx * self._dx - xy * self._dy,
+            yx, yy, -yx * self._dx - yy * self._dy,
+            )
         return self
 
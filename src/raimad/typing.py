@@ -24,7 +24,8 @@ Point: TypeAlias = \
 Poly: TypeAlias = Sequence[Point]
 PolyArray: TypeAlias = np.typing.NDArray[np.float64]
 Polys: TypeAlias = Sequence[Poly]
-Geoms: TypeAlias = dict[str, Polys]
+Geoms: TypeAlias = rai.PackedGeoms | dict[str, Polys]
+PackedPolys: TypeAlias = rai.PackedPolys
 Transform: TypeAlias = rai.Transform
 BBox: TypeAlias = rai.BBox
 Affine: TypeAlias = np.typing.NDArray[np.float64]
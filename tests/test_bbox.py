@@ -288,6 +288,91 @@ class TestBBox(ArrayAlmostEqual, unittest.TestCase, decimal=2):
         self.assertArrayAlmostEqual(c2.bbox.mid, (-10 - 5, 0))
         self.assertArrayAlmostEqual(c3.bbox.mid, (10, -2))
 
+    def test_bbox_add_xyarray(self):
+        bbox = rai.BBox()
+        bbox.add_xyarray(np.empty((0, 2)))
+        self.assertTrue(bbox.is_empty())
+
+        bbox.add_xyarray([(1, 2), (3, -4)])
+        bbox.add_xyarray(np.array([(0, 0), (2, 1)]))
+        self.assertEqual(bbox.as_list(), [0, -4, 3, 2])
+        self.assertIs(type(bbox.min_x), float)
+
+    def test_bboxes(self):
+        circle = rai.Circle(1)
+        proxy = circle.proxy().move(5, 0)
+        polys = rai.PackedPolys([
+            [(0, 0), (1, 0), (1, 2)],
+            [],
+            [(-1, -1), (0, -3)],
+            ])
+
+        bounds = rai.bboxes([
+            circle,
+            proxy,
+            polys,
+            np.array([(1, 1), (2, 3)]),
+            np.empty((0, 2)),
+            ])
+        self.assertEqual(bounds.shape, (5, 4))
+        self.assertArrayAlmostEqual(bounds[0], circle.bbox)
+        self.assertArrayAlmostEqual(bounds[1], proxy.bbox)
+        self.assertArrayAlmostEqual(bounds[2], [-1, -3, 1, 2])
+        self.assertArrayAlmostEqual(bounds[3], [1, 1, 2, 3])
+        self.assertTrue(np.array_equal(bounds[4], rai.bvh.EMPTY))
+        self.assertEqual(rai.bboxes([]).shape, (0, 4))
+
+        self.assertTrue(np.array_equal(
+            polys.bboxes(),
+            [
+                [0, 0, 1, 2],
+                [np.inf, np.inf, -np.inf, -np.inf],
+                [-1, -3, 0, -1],
+                ],
+            ))
+        self.assertTrue(rai.BBox.from_bounds(rai.bvh.EMPTY).is_empty())
+
+    def test_bbox_cached(self):
+        compo = TwoCircles()
+        bounds = rai.bboxcache.compo_bounds(compo)
+        self.assertIs(rai.bboxcache.compo_bounds(compo), bounds)
+
+        # Moving a subcompo invalidates the cache
+        compo.subcompos[1].movex(10)
+        self.assertArrayAlmostEqual(compo.bbox, [-10, -5, 20, 5])
+
+        # Adding geometry does too
+        compo.geoms['extra'] = [[(0, 0), (0, 30), (1, 30)]]
+        self.assertArrayAlmostEqual(compo.bbox, [-10, -5, 20, 30])
+
+        # Proxies reuse the cached bbox of their compo
+        proxy = compo.proxy().rotate(np.deg2rad(90))
+        bounds = rai.bboxcache.proxy_bounds(proxy)
+        self.assertIs(rai.bboxcache.proxy_bounds(proxy), bounds)
+        self.assertArrayAlmostEqual(proxy.bbox, [-30, -10, 5, 20])
+        proxy.move(1, 0)
+        self.assertArrayAlmostEqual(proxy.bbox, [-29, -10, 6, 20])
+
+    def test_bbox_cached_exact(self):
+        # Rotated placements are still exact
+        for angle in (0.3, np.deg2rad(90), np.deg2rad(45)):
+            proxy = RotatedCircles().proxy().rotate(angle).move(1, 2)
+            vertices = np.concatenate([
+                polys.vertices for polys in proxy.steamroll().values()
+                ])
+            self.assertArrayAlmostEqual(
+                proxy.bbox,
+                [*vertices.min(axis=0), *vertices.max(axis=0)],
+                )
+
+    def test_bbox_frozen(self):
+        compo = TwoCircles()
+        compo.bbox
+        entry = compo._bbox_entry
+        compo.freeze()
+        compo.bbox
+        self.assertIs(compo._bbox_entry, entry)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+
+import numpy as np
+
+import raimad as rai
+
+from .utils import ArrayAlmostEqual
+
+class Grid(rai.Compo):
+    def _make(self):
+        rect = rai.RectLW(1, 1)
+        for x in range(10):
+            for y in range(10):
+                self.subcompos.append(rect.proxy().move(x * 2, y * 2))
+
+class TestBVH(ArrayAlmostEqual, unittest.TestCase):
+
+    def test_bounds(self):
+        grid = Grid()
+        self.assertArrayAlmostEqual(
+            rai.bvh.bounds(grid),
+            [-0.5, -0.5, 18.5, 18.5],
+            )
+        self.assertArrayAlmostEqual(
+            rai.bvh.bounds(grid.proxy().move(1, 0).rotate(rai.quartercircle)),
+            [-18.5, 0.5, 0.5, 19.5],
+            )
+
+        node = rai.bvh.node(grid)
+        self.assertEqual(node.child_bounds.shape, (100, 4))
+        self.assertArrayAlmostEqual(
+            node.child_bounds[11],
+            [1.5, 1.5, 2.5, 2.5],
+            )
+
+        # Rotated boxes are never smaller than the exact bbox
+        proxy = grid.proxy().rotate(0.3)
+        bounds = rai.bvh.bounds(proxy)
+        bbox = proxy.bbox
+        self.assertTrue(bounds[0] <= bbox.min_x and bounds[1] <= bbox.min_y)
+        self.assertTrue(bounds[2] >= bbox.max_x and bounds[3] >= bbox.max_y)
+
+    def test_empty(self):
+        class Empty(rai.Compo):
+            def _make(self):
+                pass
+
+        self.assertTrue(np.array_equal(
+            rai.bvh.bounds(Empty().proxy().rotate(1)),
+            rai.bvh.EMPTY,
+            ))
+
+    def test_region(self):
+        grid = Grid()
+        geoms = grid.steamroll(region=[-1, -1, 2, 2])
+        self.assertEqual(len(geoms['root']), 4)
+        self.assertArrayAlmostEqual(
+            geoms['root'].vertices,
+            np.concatenate([
+                grid.subcompos[index].steamroll()['root'].vertices
+                for index in (0, 1, 10, 11)
+                ]),
+            )
+
+        # A proxy applies its transform before the region
+        proxy = grid.proxy().move(100, 0)
+        self.assertEqual(len(proxy.steamroll(region=[-1, -1, 2, 2])), 0)
+        region = rai.BBox(np.array([(99, -1), (101, 1)]))
+        self.assertEqual(len(proxy.steamroll(region=region)['root']), 1)
+
+        batches = list(grid.iter_steamroll(region=[17, 17, 30, 30]))
+        self.assertEqual(sum(len(polys) for _, polys in batches), 1)
+
+    def test_region_cached(self):
+        grid = Grid()
+        node = rai.bvh.node(grid)
+        self.assertIs(grid._bvh_node, node)
+        self.assertIs(rai.bvh.node(grid), node)
+
+        # Moving a subcompo only rebuilds the nodes above it
+        rect = grid.subcompos[0].compo
+        rect_node = rect._bvh_node
+        grid.subcompos[0].move(-10, 0)
+        node = rai.bvh.node(grid)
+        self.assertIs(grid._bvh_node, node)
+        self.assertIs(rect._bvh_node, rect_node)
+        self.assertArrayAlmostEqual(node.bounds, [-10.5, -0.5, 18.5, 18.5])
+        self.assertEqual(len(grid.steamroll(region=[-11, -1, -9, 1])), 1)
+
+        grid.freeze()
+        self.assertIs(rai.bvh.node(grid), node)
+
+    def test_region_export(self):
+        grid = Grid()
+        svg = rai.export_svg(grid, region=[-1, -1, 0, 0])
+        self.assertEqual(svg.count('<polygon'), 1)
+
+        cif = rai.export_cif(grid, region=[-1, -1, 0, 0])
+        self.assertEqual(cif.count('P '), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
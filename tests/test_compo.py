@@ -37,6 +37,13 @@ class BareStructural(rai.Compo):
                 )
             )
 
+class AssignedGeometric(rai.Compo):
+    def _make(self):
+        self.geoms = {
+            'root': [[(0, 0), (10, 0), (10, 10)]],
+            'other': [[(0, 0), (1, 0), (1, 1)]] * 2,
+            }
+
 class TestCompo(unittest.TestCase):
 
     def test_bare_geometric(self):
@@ -53,6 +60,21 @@ class TestCompo(unittest.TestCase):
         compo = BareGeometric()
         self.assertIsNot(compo.geoms, compo.steamroll())
 
+    def test_assigned_geoms(self):
+        compo = AssignedGeometric()
+        self.assertIsInstance(compo.geoms, rai.PackedGeoms)
+        self.assertEqual(len(compo.geoms['other']), 2)
+
+        bbox = compo.bbox
+        compo.geoms = {'root': [[(0, 0), (20, 0), (20, 20)]]}
+        self.assertEqual(compo.geoms.keys(), {'root'})
+        self.assertIsNot(compo.bbox, bbox)
+        self.assertEqual(list(compo.bbox), [0, 0, 20, 20])
+
+        compo.freeze()
+        with self.assertRaises(rai.err.FrozenError):
+            compo.geoms = {}
+
     def test_bare_structural(self):
         compo = BareStructural()
         geom = compo.steamroll()
@@ -0,0 +1,150 @@
+import gc
+import unittest
+
+import raimad as rai
+
+from .utils import ArrayAlmostEqual
+
+class Row(rai.Compo):
+    def _make(self, child):
+        for index in range(3):
+            self.subcompos.append(child.proxy().move(index * 3, 0))
+
+class TestDirty(ArrayAlmostEqual, unittest.TestCase, decimal=2):
+
+    def test_versions(self):
+        circle = rai.Circle(1)
+        row = Row(circle)
+        top = Row(row)
+        versions = (circle._version, row._version, top._version)
+
+        # Moving a proxy marks the compos above it, not below
+        top.subcompos[1].move(1, 0)
+        self.assertEqual(circle._version, versions[0])
+        self.assertEqual(row._version, versions[1])
+        self.assertGreater(top._version, versions[2])
+
+        # Changes deep down reach the top through every path once
+        version = top._version
+        row.subcompos[0].get_mark('center').to((0, 5))
+        self.assertEqual(top._version, version + 1)
+
+        version = top._version
+        circle.geoms['root'].append([(0, 0), (1, 0), (1, 1)])
+        self.assertGreater(row._version, versions[1])
+        self.assertEqual(top._version, version + 1)
+
+        version = row._version
+        row.subcompos.append(circle.proxy())
+        row.geoms['new'] = [[(0, 0), (1, 0), (1, 1)]]
+        row.subcompos[0].map('other')
+        self.assertEqual(row._version, version + 3)
+
+    def test_parents(self):
+        # Temporary proxies aren't linked to anything
+        circle = rai.Circle(1)
+        for _ in range(100):
+            circle.proxy().move(1, 0)
+        self.assertIsNone(circle._parents)
+
+        # A container is linked once, however many proxies it holds
+        row = Row(circle)
+        self.assertIs(circle._parents, row.subcompos._ref)
+
+        # Dead containers are dropped as more get linked
+        for _ in range(200):
+            Row(circle)
+        gc.collect()
+        self.assertLess(len(circle._parents), 100)
+
+        version = circle._version
+        circle.geoms['root'].append([(0, 0), (1, 0), (1, 1)])
+        self.assertEqual(circle._version, version + 1)
+
+    def test_setitem(self):
+        circle = rai.Circle(1)
+
+        class Named(rai.Compo):
+            def _make(self):
+                self.subcompos['left'] = circle.proxy().move(-5, 0)
+                self.subcompos['middle'] = circle
+                right = circle.proxy().move(5, 0)
+                self.auto_subcompos()
+
+        named = Named()
+        self.assertIsInstance(named.subcompos['middle'], rai.Proxy)
+        self.assertArrayAlmostEqual(named.bbox, [-6, -1, 6, 1])
+
+        named.subcompos['left'].move(0, 10)
+        self.assertArrayAlmostEqual(named.bbox, [-6, -1, 6, 11])
+        named.subcompos['right'].move(0, -10)
+        self.assertArrayAlmostEqual(named.bbox, [-6, -11, 6, 11])
+
+        version = named._version
+        named.subcompos['other'] = circle.proxy().move(20, 0)
+        self.assertEqual(named._version, version + 1)
+        self.assertArrayAlmostEqual(named.bbox, [-6, -11, 21, 11])
+
+    def test_identity_proxies(self):
+        circle = rai.Circle(1)
+
+        class Pair(rai.Compo):
+            def _make(self):
+                self.subcompos.append(circle.proxy())
+                self.subcompos.append(circle.proxy())
+
+        pair = Pair()
+        first, second = pair.subcompos[0], pair.subcompos[1]
+
+        # Both share the identity transform until they're moved
+        self.assertIs(first._transform, second._transform)
+        self.assertArrayAlmostEqual(pair.bbox, [-1, -1, 1, 1])
+
+        first.move(5, 0)
+        self.assertIsNot(first._transform, second._transform)
+        self.assertArrayAlmostEqual(pair.bbox, [-1, -1, 6, 1])
+
+        second.get_mark('center').to((0, 5))
+        self.assertArrayAlmostEqual(pair.bbox, [-1, -1, 6, 6])
+
+        third = circle.proxy()
+        pair.subcompos.append(third)
+        third.map('other')
+        self.assertEqual(pair.reachable_layers(), {'root', 'other'})
+
+        fourth = circle.proxy()
+        pair.subcompos.append(fourth)
+        fourth.transform = rai.Transform().move(0, -5)
+        fourth.transform.move(0, -1)
+        self.assertArrayAlmostEqual(pair.bbox, [-1, -7, 6, 6])
+
+        # Frozen identity proxies keep sharing it
+        pair.freeze()
+        with self.assertRaises(rai.err.FrozenError):
+            third.move(1, 0)
+
+    def test_caches(self):
+        circle = rai.Circle(1)
+        row = Row(circle)
+        top = Row(row)
+        other = Row(rai.Circle(2))
+        top.subcompos.append(other.proxy())
+
+        self.assertArrayAlmostEqual(top.bbox, [-2, -2, 13, 2])
+        entries = (circle._bbox_entry, other._bbox_entry, top._bbox_entry)
+
+        # Only the branches above the change are recomputed
+        row.subcompos[2].move(0, 10)
+        self.assertArrayAlmostEqual(top.bbox, [-2, -2, 13, 11])
+        self.assertIs(circle._bbox_entry, entries[0])
+        self.assertIs(other._bbox_entry, entries[1])
+        self.assertIsNot(top._bbox_entry, entries[2])
+
+        self.assertEqual(len(top.steamroll(region=[13, 10, 14, 11])), 1)
+        self.assertEqual(top.reachable_layers(), {'root'})
+        row.subcompos[0].map('other')
+        self.assertEqual(top.reachable_layers(), {'root', 'other'})
+
+
+if __name__ == '__main__':
+    unittest.main()
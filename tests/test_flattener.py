@@ -0,0 +1,269 @@
+import unittest
+
+import numpy as np
+
+import raimad as rai
+
+from .utils import ArrayAlmostEqual
+
+class Chain(rai.Compo):
+    def _make(self, child=None):
+        self.geoms.update({'root': [[(0, 0), (1, 0), (1, 1)]]})
+        if child is not None:
+            self.subcompos.append(child.proxy().move(1, 0))
+
+class Nested(rai.Compo):
+    def _make(self):
+        inner = rai.RectLW(2, 1).proxy().map('a').rotate(0.3).move(1, 2)
+        self.subcompos.append(inner.proxy().map({'a': 'b'}).scale(2))
+        self.subcompos.append(rai.Circle(1).proxy().move(5, 5))
+        self.subcompos.append(rai.Circle(1).proxy().map('b'))
+
+class TestFlattener(ArrayAlmostEqual, unittest.TestCase):
+
+    def test_no_recursion_limit(self):
+        top = None
+        for _ in range(5000):
+            top = Chain(top)
+
+        geoms = top.steamroll()
+        self.assertEqual(len(geoms['root']), 5000)
+        self.assertArrayAlmostEqual(
+            geoms['root'][-1],
+            [[4999, 0], [5000, 0], [5000, 1]],
+            )
+
+    def test_matches_flat_transforms(self):
+        compo = Nested()
+        geoms = rai.flatten_geoms(compo)
+        self.assertEqual(list(geoms.keys()), ['b', 'root'])
+        self.assertEqual(len(geoms['b']), 2)
+
+        proxy = compo.subcompos[0]
+        expected = proxy.get_flat_transform().transform_xyarray(
+            proxy.final().geoms['root'][0]
+            )
+        self.assertArrayAlmostEqual(geoms['b'][0], expected)
+        self.assertArrayAlmostEqual(
+            geoms['root'][0],
+            rai.Circle(1).geoms['root'][0] + (5, 5),
+            )
+
+        # Flattening a proxy starts from its flat transform
+        geoms = rai.flatten_geoms(proxy)
+        self.assertEqual(list(geoms.keys()), ['b'])
+        self.assertArrayAlmostEqual(geoms['b'][0], expected)
+
+    def test_instances(self):
+        child = Chain(Chain())
+        parent = Chain()
+        for index in range(5):
+            parent.subcompos.append(child.proxy().rotate(index).move(0, index))
+        parent.subcompos.append(child.proxy().map('other'))
+
+        geoms = parent.steamroll()
+        self.assertEqual(len(geoms['root']), 11)
+        self.assertEqual(len(geoms['other']), 2)
+        self.assertEqual(list(geoms['root'].offsets), list(range(0, 34, 3)))
+        for index, proxy in enumerate(parent.subcompos.values()):
+            expected = proxy.steamroll()
+            for layer, polys in expected.items():
+                start = 1 + index * 2 if layer == 'root' else 0
+                for offset, poly in enumerate(polys):
+                    self.assertArrayAlmostEqual(
+                        geoms[layer][start + offset],
+                        poly,
+                        )
+
+    def test_instances_table(self):
+        compo = Nested()
+        table = rai.flatten_instances(compo)
+
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table.affines.shape, (4, 3, 3))
+        self.assertIs(table.compos[0], compo)
+        self.assertEqual(list(table.parents), [-1, 0, 0, 0])
+        self.assertEqual(table.path(0), ())
+        self.assertEqual(table.path(1), (0, ))
+        self.assertEqual(list(table.depths()), [0, 1, 1, 1])
+
+        for index, proxy in enumerate(compo.subcompos.values(), 1):
+            self.assertIs(table.compos[index], proxy.final())
+            self.assertArrayAlmostEqual(
+                table.affines[index],
+                proxy.get_flat_transform()._affine,
+                )
+            self.assertEqual(
+                table.lmaps[index]['root'],
+                proxy.get_flat_lmap()['root'],
+                )
+
+        self.assertEqual(table.lmaps[1]['root'], 'b')
+        self.assertEqual(table.lmaps[2]['root'], 'root')
+
+    def test_instances_deep(self):
+        top = None
+        for _ in range(5000):
+            top = Chain(top)
+
+        table = rai.flatten_instances(top)
+        self.assertEqual(len(table), 5000)
+        self.assertArrayAlmostEqual(table.affines[:, 0, 2], np.arange(5000))
+        self.assertEqual(table.path(4999), (0, ) * 4999)
+
+    def test_geoms_view(self):
+        proxy = Nested().proxy().move(1, 0)
+        view = proxy.steamroll_view()
+
+        self.assertIsInstance(view, rai.GeomsView)
+        self.assertEqual(view.keys(), {'b', 'root'})
+        self.assertEqual(view.num_polys('b'), 2)
+        self.assertEqual(
+            view.num_vertices(),
+            view.num_vertices('b') + view.num_vertices('root'),
+            )
+        # Nothing has been transformed yet
+        self.assertEqual(view._layers, {})
+
+        self.assertEqual(len(view['root']), 1)
+        self.assertEqual(list(view._layers), ['root'])
+        self.assertIs(view['root'], view['root'])
+        with self.assertRaises(rai.err.FrozenError):
+            view['root'].append([(0, 0), (1, 0), (1, 1)])
+
+        expected = rai.flatten_geoms(proxy)
+        geoms = view.materialize()
+        self.assertIsInstance(geoms, rai.PackedGeoms)
+        self.assertEqual(list(geoms.keys()), list(expected.keys()))
+        for layer, polys in expected.items():
+            self.assertArrayAlmostEqual(geoms[layer].vertices, polys.vertices)
+
+        with self.assertRaises(KeyError):
+            view['nonexistent']
+
+    def test_steamroll_mutable(self):
+        compo = Nested()
+        for geoms in (compo.steamroll(), compo.proxy().steamroll()):
+            self.assertIsInstance(geoms, rai.PackedGeoms)
+            geoms['root'].append([(0, 0), (1, 0), (1, 1)])
+            geoms['new'] = [[(0, 0), (1, 0), (1, 1)]]
+            self.assertEqual(
+                len(geoms['root']),
+                compo.steamroll_view().num_polys('root') + 1,
+                )
+
+    def test_proxy_geoms_cached(self):
+        compo = Chain()
+        proxy = compo.proxy().move(1, 0)
+        geoms = proxy.geoms
+        self.assertIs(proxy.geoms, geoms)
+        self.assertArrayAlmostEqual(geoms['root'][0][0], (1, 0))
+
+        proxy.move(1, 0)
+        self.assertIsNot(proxy.geoms, geoms)
+        self.assertArrayAlmostEqual(proxy.geoms['root'][0][0], (2, 0))
+
+        geoms = proxy.geoms
+        compo.geoms['root'].append([(0, 0), (0, 1), (1, 1)])
+        self.assertIsNot(proxy.geoms, geoms)
+        self.assertEqual(len(proxy.geoms['root']), 2)
+
+        # Same number of polys and vertices, different geometry
+        geoms = proxy.geoms
+        compo.geoms['root'] = [
+            poly + 5 for poly in compo.geoms['root']
+            ]
+        self.assertIsNot(proxy.geoms, geoms)
+        self.assertArrayAlmostEqual(proxy.geoms['root'][0][0], (7, 5))
+
+    def test_iter_steamroll(self):
+        compo = Nested()
+        expected = compo.steamroll()
+        batches = list(compo.iter_steamroll(max_vertices=50))
+
+        for layer, polys in batches:
+            self.assertTrue(polys.num_vertices <= 50 or len(polys) == 1)
+
+        for layer, polys in expected.items():
+            vertices = [
+                batch.vertices for name, batch in batches if name == layer
+                ]
+            self.assertArrayAlmostEqual(
+                np.concatenate(vertices),
+                polys.vertices,
+                )
+
+        # Consecutive compos share batches
+        top = None
+        for _ in range(100):
+            top = Chain(top)
+        batches = list(top.proxy().iter_steamroll(max_vertices=30))
+        self.assertEqual([len(polys) for _, polys in batches], [10] * 10)
+        self.assertArrayAlmostEqual(
+            batches[-1][1][-1],
+            [[99, 0], [100, 0], [100, 1]],
+            )
+
+    def test_layers(self):
+        compo = Nested()
+        self.assertEqual(compo.reachable_layers(), {'b', 'root'})
+        self.assertEqual(compo.subcompos[0].reachable_layers(), {'b'})
+
+        full = compo.steamroll()
+        geoms = compo.steamroll(layers='root')
+        self.assertEqual(list(geoms.keys()), ['root'])
+        self.assertArrayAlmostEqual(
+            geoms['root'].vertices,
+            full['root'].vertices,
+            )
+
+        view = compo.proxy().steamroll_view(layers=['b'])
+        self.assertEqual(list(view.keys()), ['b'])
+        self.assertArrayAlmostEqual(view['b'].vertices, full['b'].vertices)
+
+        batches = list(compo.iter_steamroll(layers={'b'}))
+        self.assertEqual({layer for layer, _ in batches}, {'b'})
+
+        # Subcompos with nothing on the layer aren't visited
+        visited = [real for real, *_ in rai.flattener.walk(compo, 'root')]
+        self.assertEqual(len(visited), 2)
+
+    def test_layers_cached(self):
+        compo = Nested()
+        self.assertIsNone(compo._reachable_layers)
+        layers = compo.reachable_layers()
+        self.assertEqual(compo._reachable_layers, (compo._version, layers))
+        self.assertIs(compo.reachable_layers(), layers)
+
+        compo.subcompos[2].map('c')
+        self.assertEqual(compo.reachable_layers(), {'b', 'root', 'c'})
+
+    def test_layers_export(self):
+        compo = rai.Snowman()
+        svg = rai.export_svg(compo, layers='carrot')
+        self.assertEqual(
+            svg.count('<polygon'),
+            len(compo.steamroll()['carrot']),
+            )
+        # Framed like the full drawing
+        header = rai.export_svg(compo).split('<polygon')[0]
+        self.assertTrue(svg.startswith(header))
+
+        cif = rai.export_cif(compo, layers=['snow'])
+        self.assertIn('L Lsnow;', cif)
+        self.assertNotIn('L Lcarrot;', cif)
+
+    def test_storage(self):
+        with rai.storage(dbu=1e-3):
+            compo = Nested()
+        geoms = compo.steamroll()
+        self.assertEqual(geoms['b'].raw.dtype, np.int64)
+        self.assertTrue(np.allclose(
+            geoms['root'][0],
+            rai.Circle(1).geoms['root'][0] + (5, 5),
+            atol=1e-3,
+            ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+import numpy as np
+
+import raimad as rai
+
+class AutoFrozen(rai.Compo):
+    freeze_on_make = True
+
+    def _make(self):
+        self.subcompos.rect = rai.RectLW(10, 20)
+        self.subcompos.circle = rai.Circle(5).proxy().move(20, 0)
+        self.marks.center = (0, 0)
+
+class Holder(rai.Compo):
+    def _make(self, child):
+        self.subcompos.append(child.proxy().proxy().move(1, 0))
+
+class TestFreeze(unittest.TestCase):
+
+    def test_freeze_geoms(self):
+        rect = rai.RectLW(10, 20).freeze()
+        self.assertTrue(rect.frozen)
+
+        with self.assertRaises(rai.err.FrozenError):
+            rect.geoms['root'].append([(0, 0), (1, 0), (1, 1)])
+        with self.assertRaises(rai.err.FrozenError):
+            rect.geoms['other'] = [[(0, 0), (1, 0), (1, 1)]]
+        with self.assertRaises(ValueError):
+            rect.geoms['root'][0][0] = (5, 5)
+        with self.assertRaises(rai.err.FrozenError):
+            rect.marks.corner = (0, 0)
+        with self.assertRaises(rai.err.FrozenError):
+            rect.subcompos.other = rai.RectLW(1, 1)
+
+    def test_freeze_hierarchy(self):
+        compo = AutoFrozen()
+        self.assertTrue(compo.frozen)
+        self.assertTrue(compo.subcompos.rect.frozen)
+        self.assertTrue(compo.subcompos.circle.compo.frozen)
+
+        with self.assertRaises(rai.err.FrozenError):
+            compo.subcompos.circle.move(1, 1)
+        with self.assertRaises(rai.err.FrozenError):
+            compo.subcompos.circle.bbox.mid.to((0, 0))
+        with self.assertRaises(rai.err.FrozenError):
+            compo.subcompos.circle.map('other')
+
+    def test_frozen_still_usable(self):
+        compo = AutoFrozen()
+
+        self.assertEqual(len(compo.steamroll()['root']), 2)
+        self.assertTrue(np.allclose(list(compo.bbox), [-5, -10, 25, 10]))
+
+        # Proxies of frozen compos can still be placed
+        proxy = compo.proxy().move(5, 5)
+        self.assertTrue(np.allclose(list(proxy.bbox), [0, -5, 30, 15]))
+
+        # Copies of frozen transforms are not frozen
+        copied = compo.subcompos.circle.transform.copy().move(1, 1)
+        self.assertIsNotNone(copied)
+
+    def test_freeze_deep(self):
+        compo = rai.RectLW(1, 1)
+        for _ in range(3000):
+            compo = Holder(compo)
+        proxy = compo.proxy()
+
+        proxy.freeze()
+        self.assertTrue(proxy.frozen)
+        while compo.subcompos:
+            self.assertTrue(compo.frozen)
+            compo = compo.subcompos[0].compo.compo
+        self.assertTrue(compo.frozen)
+
+    def test_not_frozen_by_default(self):
+        rect = rai.RectLW(10, 20)
+        self.assertFalse(rect.frozen)
+        rect.geoms['root'].append([(0, 0), (1, 0), (1, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import time
+import unittest
+
+import numpy as np
+
+import raimad as rai
+
+from .utils import ArrayAlmostEqual
+
+class Radial(rai.Compo):
+    def _make(self):
+        sec = rai.AnSec(r1=10, r2=12, theta1=0, theta2=0.2)
+        for index in range(20):
+            self.subcompos.append(sec.proxy().rotate(index * 0.3))
+
+class TestHull(ArrayAlmostEqual, unittest.TestCase):
+
+    def test_convex_hull(self):
+        points = np.array([
+            (0, 0), (2, 0), (2, 2), (0, 2),
+            (1, 1), (1, 0), (0, 0), (0.5, 1.5),
+            ])
+        self.assertArrayAlmostEqual(
+            rai.hull.convex_hull(points),
+            [(0, 0), (2, 0), (2, 2), (0, 2)],
+            )
+
+        self.assertArrayAlmostEqual(
+            rai.hull.convex_hull([(1, 1), (0, 0), (2, 2), (1, 1)]),
+            [(0, 0), (2, 2)],
+            )
+        self.assertEqual(rai.hull.convex_hull(np.empty((0, 2))).shape, (0, 2))
+
+        # Enough points to go through the interior filter
+        rng = np.random.default_rng(0)
+        points = rng.random((1000, 2))
+        hull = rai.hull.convex_hull(points)
+        edges = np.roll(hull, -1, axis=0) - hull
+        for start, edge in zip(hull, edges):
+            cross = (
+                edge[0] * (points[:, 1] - start[1])
+                - edge[1] * (points[:, 0] - start[0])
+                )
+            self.assertTrue((cross >= -1e-12).all())
+
+    def test_concave_arc(self):
+        # Every pass of the vectorized chain only drops a few points here
+        x = np.linspace(-1, 1, 40001)
+        points = np.column_stack((x, -np.sqrt(np.abs(x))))
+        start = time.perf_counter()
+        hull = rai.hull.convex_hull(points)
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertArrayAlmostEqual(hull, [(-1, -1), (1, -1), (0, 0)])
+
+        # Both halves of a circle are all hull points
+        angles = np.linspace(0, 2 * np.pi, 1000, endpoint=False)
+        circle = np.column_stack((np.cos(angles), np.sin(angles)))
+        self.assertEqual(len(rai.hull.convex_hull(circle)), 1000)
+
+    def test_compo_hull(self):
+        compo = Radial()
+        hull = compo.convex_hull()
+        vertices = compo.steamroll()['root'].vertices
+        self.assertArrayAlmostEqual(
+            hull,
+            rai.hull.convex_hull(vertices),
+            )
+
+        proxy = compo.proxy().rotate(0.1).move(3, 4)
+        self.assertArrayAlmostEqual(
+            proxy.convex_hull(),
+            proxy.get_flat_transform().transform_xyarray(hull),
+            )
+
+    def test_compo_hull_cached(self):
+        compo = Radial()
+        hull = compo.convex_hull()
+        self.assertIs(compo.convex_hull(), hull)
+
+        compo.subcompos[0].rotate(0.1)
+        self.assertIsNot(compo.convex_hull(), hull)
+
+    def test_rotated_bbox(self):
+        compo = Radial()
+        proxy = compo.proxy().rotate(0.7)
+        vertices = proxy.steamroll()['root'].vertices
+        self.assertArrayAlmostEqual(
+            proxy.bbox,
+            rai.BBox(vertices),
+            )
+
+        # Rotated subcompos inside a rotated subcompo
+        class Outer(rai.Compo):
+            def _make(self):
+                self.subcompos.append(compo.proxy().rotate(0.2).move(1, 0))
+
+        outer = Outer()
+        self.assertArrayAlmostEqual(
+            outer.bbox,
+            rai.BBox(outer.steamroll()['root'].vertices),
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
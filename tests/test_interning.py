@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+
+import raimad as rai
+
+from .utils import ArrayAlmostEqual
+
+class TestInterning(ArrayAlmostEqual, unittest.TestCase):
+
+    def test_intern_table(self):
+        table = rai.InternTable()
+        first = table.intern(np.arange(10.0))
+        second = table.intern(np.arange(10.0))
+        other = table.intern(np.arange(11.0))
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertFalse(first.flags.writeable)
+        self.assertEqual(table.hits, 1)
+        self.assertEqual(table.misses, 2)
+        self.assertEqual(table.bytes_saved, 80)
+
+    def test_interned_compos(self):
+        table = rai.InternTable()
+        with rai.storage(intern=table):
+            circles = [rai.Circle(5) for _ in range(10)]
+            different = rai.Circle(6)
+
+        buffers = [circle.geoms['root'].raw for circle in circles]
+        for buffer in buffers:
+            self.assertTrue(np.shares_memory(buffer, buffers[0]))
+        self.assertFalse(
+            np.shares_memory(different.geoms['root'].raw, buffers[0])
+            )
+        # The offsets of the different circle are still the same
+        self.assertEqual(table.hits, 9 * 2 + 1)
+        self.assertEqual(
+            table.bytes_saved,
+            9 * buffers[0].nbytes
+            + 10 * circles[0].geoms['root'].offsets.nbytes,
+            )
+
+    def test_interned_copy_on_write(self):
+        with rai.storage(intern=rai.InternTable()):
+            first = rai.RectLW(10, 20)
+            second = rai.RectLW(10, 20)
+
+        first.geoms['root'].append([(0, 0), (1, 0), (1, 1)])
+
+        self.assertEqual(len(first.geoms['root']), 2)
+        self.assertEqual(len(second.geoms['root']), 1)
+        self.assertArrayAlmostEqual(
+            first.geoms['root'][0],
+            second.geoms['root'][0],
+            )
+
+    def test_not_interned_by_default(self):
+        first = rai.RectLW(10, 20)
+        second = rai.RectLW(10, 20)
+        self.assertFalse(np.shares_memory(
+            first.geoms['root'].raw,
+            second.geoms['root'].raw,
+            ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+
+import numpy as np
+
+import raimad as rai
+
+class LazyRect(rai.RectLW):
+    lazy = True
+    num_made = 0
+
+    def _make(self, length: float, width: float):
+        type(self).num_made += 1
+        super()._make(length, width)
+
+class LazyHolder(rai.Compo):
+    lazy = True
+
+    def _make(self):
+        self.subcompos.rect = LazyRect(10, 20)
+
+class LazyFailing(rai.Compo):
+    lazy = True
+    num_made = 0
+
+    def _make(self):
+        type(self).num_made += 1
+        self.geoms['root'] = [[(0, 0), (1, 0), (1, 1)]]
+        raise ValueError("failed halfway")
+
+class TestLazy(unittest.TestCase):
+
+    def setUp(self):
+        LazyRect.num_made = 0
+
+    def test_lazy_deferred(self):
+        rects = [LazyRect(length, 5) for length in range(100)]
+        self.assertEqual(LazyRect.num_made, 0)
+
+        self.assertEqual(len(rects[42].geoms['root']), 1)
+        self.assertEqual(LazyRect.num_made, 1)
+
+        rects[42].bbox
+        rects[42].geoms
+        self.assertEqual(LazyRect.num_made, 1)
+
+    def test_lazy_triggers(self):
+        LazyRect(1, 1).bbox
+        LazyRect(1, 1).subcompos
+        LazyRect(1, 1).marks
+        LazyRect(1, 1).proxy().steamroll()
+        rai.export_cif(LazyRect(1, 1))
+        rai.export_svg(LazyRect(1, 1))
+        self.assertEqual(LazyRect.num_made, 6)
+
+    def test_lazy_nested(self):
+        holder = LazyHolder()
+        self.assertEqual(LazyRect.num_made, 0)
+
+        geoms = holder.steamroll()
+        self.assertEqual(LazyRect.num_made, 1)
+        self.assertEqual(len(geoms['root']), 1)
+
+    def test_lazy_failed_make(self):
+        compo = LazyFailing()
+        for attempt in range(1, 4):
+            with self.assertRaises(ValueError):
+                compo.geoms
+            self.assertEqual(LazyFailing.num_made, attempt)
+        with self.assertRaises(ValueError):
+            compo.bbox
+        with self.assertRaises(ValueError):
+            compo.proxy().steamroll()
+        self.assertEqual(len(compo._geoms), 0)
+
+    def test_lazy_storage(self):
+        with rai.storage(precision=np.float32):
+            holder = LazyHolder()
+
+        self.assertEqual(
+            holder.steamroll()['root'].vertices.dtype,
+            np.float32,
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
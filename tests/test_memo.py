@@ -0,0 +1,132 @@
+import unittest
+
+import numpy as np
+
+import raimad as rai
+
+class CachedCircle(rai.Circle):
+    compo_cache = rai.CompoCache(maxsize=2)
+
+class CachedPoly(rai.Compo):
+    compo_cache = rai.CompoCache()
+
+    def _make(self, points):
+        self.geoms.update({'root': [points]})
+
+class Tagged(rai.Compo):
+    compo_cache = rai.CompoCache()
+
+    def _make(self, tag):
+        self.tag = tag
+
+class Checked(rai.Compo):
+    compo_cache = rai.CompoCache()
+
+    def _make(self, size):
+        self.geoms.update({'root': [[(0, 0), (size, 0), (size, size)]]})
+        if size < 0:
+            raise ValueError("size must not be negative")
+
+class LazyChecked(Checked):
+    lazy = True
+
+class TestMemo(unittest.TestCase):
+
+    def setUp(self):
+        CachedCircle.compo_cache.clear()
+        CachedPoly.compo_cache.clear()
+        Tagged.compo_cache.clear()
+        Checked.compo_cache.clear()
+
+    def test_memo_hit(self):
+        first = CachedCircle(5)
+        self.assertIs(CachedCircle(5), first)
+        self.assertIs(CachedCircle(radius=5), first)
+        self.assertIs(CachedCircle(5, num_points=200), first)
+        self.assertIsNot(CachedCircle(6), first)
+
+        self.assertEqual(CachedCircle.compo_cache.hits, 3)
+        self.assertEqual(CachedCircle.compo_cache.misses, 2)
+        self.assertEqual(len(first.geoms['root']), 1)
+
+    def test_memo_lru(self):
+        first = CachedCircle(1)
+        CachedCircle(2)
+        CachedCircle(1)
+        CachedCircle(3)  # evicts 2, the least recently used
+
+        self.assertEqual(len(CachedCircle.compo_cache), 2)
+        self.assertIs(CachedCircle(1), first)
+        misses = CachedCircle.compo_cache.misses
+        CachedCircle(2)
+        self.assertEqual(CachedCircle.compo_cache.misses, misses + 1)
+
+    def test_memo_array_options(self):
+        points = np.array([[0, 0], [10, 0], [10, 10]])
+        first = CachedPoly(points)
+
+        self.assertIs(CachedPoly(points.copy()), first)
+        self.assertIsNot(CachedPoly(points * 2), first)
+
+    def test_memo_uncacheable(self):
+        first = Tagged(tag=object())
+        second = Tagged(tag=first)
+
+        self.assertEqual(len(Tagged.compo_cache), 1)
+        self.assertIs(Tagged(tag=first), second)
+        self.assertIsNot(Tagged(tag=first.tag), first)
+
+    def test_memo_option_values(self):
+        mixed = Tagged(tag={1: 'a', 'b': 2})
+        self.assertIs(Tagged(tag={'b': 2, 1: 'a'}), mixed)
+        self.assertIsNot(Tagged(tag={1: 'a', 'b': 3}), mixed)
+
+        self.assertIsNot(Tagged(tag=-0.0), Tagged(tag=0.0))
+        self.assertIs(Tagged(tag=-0.0), Tagged(tag=-0.0))
+        self.assertIsNot(Tagged(tag=complex(1, -0.0)), Tagged(tag=1 + 0j))
+
+    def test_memo_not_default(self):
+        self.assertIsNot(rai.Circle(5), rai.Circle(5))
+
+    def test_memo_storage(self):
+        first = CachedPoly([(0, 0), (0.1234, 0), (0, 1)])
+        with rai.storage(precision=np.float32):
+            second = CachedPoly([(0, 0), (0.1234, 0), (0, 1)])
+            self.assertIsNot(second, first)
+            self.assertIs(CachedPoly([(0, 0), (0.1234, 0), (0, 1)]), second)
+            self.assertEqual(second.geoms['root'].vertices.dtype, np.float32)
+        with rai.storage(dbu=0.1):
+            self.assertIsNot(CachedPoly([(0, 0), (0.1234, 0), (0, 1)]), first)
+        self.assertIs(CachedPoly([(0, 0), (0.1234, 0), (0, 1)]), first)
+
+        partial = CachedPoly.partial().memoize()
+        first = partial(points=[(0, 0), (1, 0), (0, 1)])
+        with rai.storage(dbu=0.1):
+            self.assertIsNot(partial(points=[(0, 0), (1, 0), (0, 1)]), first)
+
+    def test_memo_failed_make(self):
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                Checked(-1)
+        self.assertEqual(len(Checked.compo_cache), 0)
+        self.assertIs(Checked(1), Checked(1))
+
+        # Lazy compos are cached before `_make` runs
+        compo = LazyChecked(-1)
+        self.assertIs(LazyChecked(-1), compo)
+        with self.assertRaises(ValueError):
+            compo.geoms
+        self.assertIsNot(LazyChecked(-1), compo)
+
+    def test_memo_partial(self):
+        partial = rai.Circle.partial(num_points=10).memoize()
+
+        first = partial(radius=5)
+        self.assertIs(partial(radius=5), first)
+        self.assertIsNot(partial(radius=6), first)
+        self.assertEqual(partial.compo_cache.hits, 1)
+        self.assertEqual(len(first.geoms['root'][0]), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
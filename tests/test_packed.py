@@ -0,0 +1,164 @@
+import unittest
+
+import numpy as np
+
+import raimad as rai
+
+from .utils import ArrayAlmostEqual
+
+class TestPacked(ArrayAlmostEqual, unittest.TestCase):
+
+    def test_packed_polys(self):
+        polys = rai.PackedPolys([
+            [(0, 0), (1, 0), (1, 1)],
+            np.array([[2, 2], [3, 2], [3, 3], [2, 3]]),
+            [],
+            ])
+
+        self.assertEqual(len(polys), 3)
+        self.assertEqual(polys.num_vertices, 7)
+        self.assertEqual(polys.vertices.dtype, np.float64)
+        self.assertEqual(list(polys.offsets), [0, 3, 7, 7])
+
+        self.assertArrayAlmostEqual(polys[1], [[2, 2], [3, 2], [3, 3], [2, 3]])
+        self.assertArrayAlmostEqual(polys[-3], [[0, 0], [1, 0], [1, 1]])
+        self.assertEqual(polys[2].shape, (0, 2))
+        self.assertEqual([len(poly) for poly in polys], [3, 4, 0])
+
+        with self.assertRaises(IndexError):
+            polys[3]
+
+    def test_packed_polys_extend(self):
+        first = rai.PackedPolys([[(0, 0), (1, 0), (1, 1)]])
+        second = rai.PackedPolys([[(5, 5), (6, 5), (6, 6)]] * 3)
+        first.extend(second)
+
+        self.assertEqual(len(first), 4)
+        self.assertEqual(list(first.offsets), [0, 3, 6, 9, 12])
+        self.assertArrayAlmostEqual(first[3], second[2])
+
+    def test_packed_geoms_dict_methods(self):
+        triangle = [(0, 0), (1, 0), (1, 1)]
+        geoms = rai.PackedGeoms()
+        geoms.update({'a': [triangle]}, b=[triangle, triangle])
+        geoms.update([('c', [triangle])])
+        self.assertEqual(list(geoms.keys()), ['a', 'b', 'c'])
+        self.assertIsInstance(geoms['b'], rai.PackedPolys)
+        self.assertEqual(len(geoms['b']), 2)
+
+        self.assertIs(geoms.setdefault('a', [triangle] * 5), geoms['a'])
+        self.assertEqual(len(geoms['a']), 1)
+        self.assertEqual(len(geoms.setdefault('d', [triangle] * 5)), 5)
+        self.assertEqual(len(geoms.setdefault('e')), 0)
+
+        geoms.clear()
+        self.assertEqual(len(geoms), 0)
+
+    def test_packed_geoms_copy(self):
+        geoms = rai.PackedGeoms({'root': [[(0, 0), (1, 0), (1, 1)]]})
+        copied = geoms.copy()
+        copied['root'].append([(2, 2), (3, 3), (4, 2)])
+        copied['root'][0][0] = (9, 9)
+
+        self.assertEqual(len(geoms['root']), 1)
+        self.assertArrayAlmostEqual(geoms['root'][0][0], (0, 0))
+
+    def test_transform_layer(self):
+        polys = rai.PackedPolys([
+            [(0, 0), (1, 0), (1, 1)],
+            [],
+            np.array([[2, 2], [3, 2], [3, 3], [2, 3]]),
+            ])
+        transform = rai.Transform().rotate(0.3).move(1, 2)
+
+        # The whole layer is transformed at once,
+        # straight into the output buffer (see flattener._write())
+        out = rai.flattener._assemble(
+            [(polys, transform, 'root')],
+            polys.storage,
+            spill=False,
+            )['root']
+        self.assertEqual(list(out.offsets), list(polys.offsets))
+        for poly, expected in zip(out, polys):
+            self.assertArrayAlmostEqual(
+                poly,
+                transform.transform_xyarray(expected),
+                )
+
+        # And that's what steamrolling a proxy goes through
+        class Layer(rai.Compo):
+            def _make(self):
+                self.geoms['root'] = polys
+
+        steamrolled = Layer().proxy().rotate(0.3).move(1, 2).steamroll()
+        self.assertEqual(
+            list(steamrolled['root'].offsets),
+            list(polys.offsets),
+            )
+        self.assertArrayAlmostEqual(
+            steamrolled['root'].vertices,
+            out.vertices,
+            )
+
+    def test_transform_stack(self):
+        polys = rai.PackedPolys([
+            [(0, 0), (1, 0), (1, 1)],
+            [(2, 2), (3, 2), (3, 3), (2, 3)],
+            ])
+        transforms = [
+            rai.Transform().move(1, 2),
+            rai.Transform().rotate(0.3),
+            rai.Transform().rotate(rai.quartercircle).scale(2),
+            ]
+
+        matrices = rai.Transform.stack(transforms)
+        self.assertEqual(matrices.shape, (3, 3, 3))
+        stacked = rai.affine.transform_stack(matrices, polys.vertices)
+        self.assertEqual(stacked.shape, (3, 7, 2))
+        for index, transform in enumerate(transforms):
+            self.assertArrayAlmostEqual(
+                stacked[index],
+                transform.transform_xyarray(polys.vertices),
+                )
+
+    def test_steamroll_instances(self):
+        class Instances(rai.Compo):
+            def _make(self):
+                rect = rai.RectLW(2, 1)
+                for index in range(10):
+                    self.subcompos.append(
+                        rect.proxy().map('other').rotate(index).move(index, 0)
+                        )
+                self.subcompos.append(rai.Circle(1).proxy())
+                self.subcompos.append(rect.proxy().move(0, 5))
+
+        compo = Instances()
+        geoms = compo.steamroll()
+        self.assertEqual(list(geoms.keys()), ['other', 'root'])
+        self.assertEqual(len(geoms['other']), 10)
+        self.assertEqual(len(geoms['root']), 2)
+        for index, subcompo in enumerate(compo.subcompos.values()):
+            if index < 10:
+                self.assertArrayAlmostEqual(
+                    geoms['other'][index],
+                    subcompo.steamroll()['other'][0],
+                    )
+
+    def test_steamroll_packed(self):
+        compo = rai.Snowman()
+        geoms = compo.steamroll()
+
+        self.assertIsInstance(geoms, rai.PackedGeoms)
+        self.assertIsInstance(geoms['snow'], rai.PackedPolys)
+        self.assertEqual(len(geoms['snow']), 3)
+
+    def test_lmap_merges_layers(self):
+        compo = rai.Snowman().proxy().map('everything')
+        geoms = compo.steamroll()
+
+        self.assertEqual(geoms.keys(), {'everything'})
+        self.assertEqual(len(geoms['everything']), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
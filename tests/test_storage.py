@@ -0,0 +1,132 @@
+import gc
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import raimad as rai
+
+from .utils import ArrayAlmostEqual
+
+class TestStorage(ArrayAlmostEqual, unittest.TestCase):
+
+    def test_storage_context(self):
+        self.assertIsNone(rai.get_storage().dbu)
+        with rai.storage(dbu=1e-3) as settings:
+            self.assertEqual(settings.dbu, 1e-3)
+            self.assertIs(rai.get_storage(), settings)
+        self.assertIsNone(rai.get_storage().dbu)
+
+    def test_dbu_snapping(self):
+        with rai.storage(dbu=1e-3):
+            rect = rai.RectLW(10.00049, 20)
+
+        polys = rect.geoms['root']
+        self.assertEqual(polys.raw.dtype, np.int64)
+        self.assertEqual(list(polys.raw[0]), [-5000, -10000])
+        self.assertArrayAlmostEqual(polys[0][0], (-5, -10))
+
+    def test_dbu_manhattan_exact(self):
+        with rai.storage(dbu=1e-3):
+            rect = rai.RectLW(10, 20)
+
+        proxy = rect.proxy()
+        for _ in range(1000):
+            # Four quarter turns cancel out the moves in between
+            proxy.rotate(rai.quartercircle).move(0.001, 0.003)
+
+        self.assertEqual(
+            proxy.steamroll()['root'].raw.tolist(),
+            rect.geoms['root'].raw.tolist(),
+            )
+
+    def test_dbu_general_transform_snaps(self):
+        with rai.storage(dbu=1e-3):
+            rect = rai.RectLW(10, 20)
+
+        geoms = rect.proxy().rotate(0.1).steamroll()
+        expected = rai.RectLW(10, 20).proxy().rotate(0.1).steamroll()
+
+        self.assertEqual(geoms['root'].raw.dtype, np.int64)
+        self.assertTrue(np.allclose(
+            geoms['root'].vertices,
+            expected['root'].vertices,
+            rtol=0,
+            atol=1e-3,
+            ))
+
+    def test_dbu_cif(self):
+        with rai.storage(dbu=1e-3):
+            rect = rai.RectLW(10, 20)
+
+        self.assertEqual(
+            rai.export_cif(rect),
+            rai.export_cif(rai.RectLW(10, 20)),
+            )
+        self.assertIn(
+            '\tP -5000 -10000 5000 -10000 5000 10000 -5000 10000 ;',
+            rai.export_cif(rect),
+            )
+
+
+    def test_float32(self):
+        with rai.storage(precision=np.float32):
+            snowman = rai.Snowman()
+
+        geoms = snowman.steamroll()
+        self.assertEqual(snowman.geoms.storage.precision, np.float32)
+        for polys in geoms.values():
+            self.assertEqual(polys.vertices.dtype, np.float32)
+
+        reference = rai.Snowman()
+        self.assertTrue(np.allclose(
+            list(snowman.bbox),
+            list(reference.bbox),
+            atol=1e-4,
+            ))
+        self.assertTrue(np.allclose(
+            geoms['snow'].vertices,
+            reference.steamroll()['snow'].vertices,
+            atol=1e-4,
+            ))
+
+    def test_float32_transform(self):
+        poly = np.array([[0, 0], [1, 0], [1, 1]], dtype=np.float32)
+        transformed = rai.Transform().rotate(0.5).transform_xyarray(poly)
+        self.assertEqual(transformed.dtype, np.float32)
+
+
+    def test_spill(self):
+        reference = rai.Snowman().steamroll()
+
+        with tempfile.TemporaryDirectory() as scratch:
+            with rai.storage(spill_dir=scratch):
+                snowman = rai.Snowman()
+
+            geoms = snowman.steamroll()
+            self.assertIsInstance(geoms['snow'].raw, np.memmap)
+            self.assertIsNot(snowman.geoms, geoms)
+            self.assertTrue(os.listdir(scratch))
+
+            for layer, polys in reference.items():
+                self.assertArrayAlmostEqual(
+                    geoms[layer].vertices,
+                    polys.vertices,
+                    )
+            self.assertArrayAlmostEqual(
+                snowman.bbox,
+                rai.Snowman().bbox,
+                )
+            self.assertEqual(
+                rai.export_svg(snowman),
+                rai.export_svg(rai.Snowman()),
+                )
+
+            del geoms
+            gc.collect()
+            self.assertEqual(os.listdir(scratch), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
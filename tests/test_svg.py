@@ -0,0 +1,46 @@
+import unittest
+
+import raimad as rai
+
+class Triangles(rai.Compo):
+    def _make(self):
+        self.geoms['a'] = [[(0, 0), (1, 0), (1, 1)]]
+        self.geoms['b'] = [[(0, 0), (2, 0), (2, 2)]]
+
+class Nested(rai.Compo):
+    def _make(self):
+        self.subcompos.append(Triangles().proxy())
+        self.subcompos.append(
+            Triangles().proxy().move(5, 0).map({'b': 'a', 'a': 'c'})
+            )
+
+# Polygons are grouped by layer, in the same order as `steamroll()`
+GOLDEN = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="27.0" height="22.0" >\n'
+    '\n'
+    '<g transform="translate(10.0,12.0)">\n'
+    '<g transform="scale(1,-1)">\n'
+    '<polygon fill="#00000000" stroke="#000000" stroke-width="1" '
+    'points="0.0,0.0 1.0,0.0 1.0,1.0 " />\n'
+    '<polygon fill="#00000000" stroke="#000000" stroke-width="1" '
+    'points="5.0,0.0 7.0,0.0 7.0,2.0 " />\n'
+    '<polygon fill="#00000000" stroke="#000000" stroke-width="1" '
+    'points="0.0,0.0 2.0,0.0 2.0,2.0 " />\n'
+    '<polygon fill="#00000000" stroke="#000000" stroke-width="1" '
+    'points="5.0,0.0 6.0,0.0 6.0,1.0 " />\n'
+    '</g></g></svg>\n'
+    )
+
+class TestSVG(unittest.TestCase):
+
+    def test_golden(self):
+        self.assertEqual(rai.export_svg(Nested()), GOLDEN)
+
+    def test_layers(self):
+        svg = rai.export_svg(Nested(), layers='c')
+        self.assertEqual(svg.count('<polygon'), 1)
+        self.assertIn('points="5.0,0.0 6.0,0.0 6.0,1.0 "', svg)
+
+
+if __name__ == '__main__':
+    unittest.main()
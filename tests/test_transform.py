@@ -39,6 +39,14 @@ class BareStructural(rai.Compo):
                 )
             )
 
+class Marked(rai.Compo):
+    def _make(self):
+        self.geoms.update({
+            'root': [[(0, 0), (1, 0), (1, 1)]],
+            'other': [[(0, 0), (0, 1), (1, 1)]],
+            })
+        self.marks.tip = (1, 0)
+
 class TestCompo(unittest.TestCase):
 
     def test_transform(self):
@@ -94,6 +102,220 @@ class TestCompo(unittest.TestCase):
         self.assertEqual(sum((compo.depth() == 0 for compo in hier)), 1)
         self.assertEqual(sum((compo.depth() == 1 for compo in hier)), 2)
 
+    def test_folded_matches_matrices(self):
+        transform = (
+            rai.Transform()
+            .move(1, 2)
+            .rotate(0.3, 1, 1)
+            .scale(2, 3)
+            .hflip(2)
+            .vflip(1)
+            .flip(1, 2)
+            )
+
+        affine = rai.affine
+        matrix = affine.move(1, 2)
+        matrix = affine.around(affine.rotate(0.3), 1, 1) @ matrix
+        matrix = affine.scale(2, 3) @ matrix
+        matrix = affine.around(affine.scale(1, -1), 0, 2) @ matrix
+        matrix = affine.around(affine.scale(-1, 1), 1, 0) @ matrix
+        matrix = affine.around(affine.scale(-1, -1), 1, 2) @ matrix
+
+        self.assertTrue(np.allclose(transform._affine, matrix))
+        self.assertTrue(np.allclose(
+            transform.copy().inverse()._affine,
+            np.linalg.inv(matrix),
+            ))
+        self.assertTrue(np.allclose(
+            transform.copy().compose(transform)._affine,
+            matrix @ matrix,
+            ))
+        self.assertTrue(np.allclose(
+            transform.transform_point((3, 4)),
+            affine.transform_point(matrix, (3, 4)),
+            ))
+
+    def test_kind(self):
+        kind = rai.TransformKind
+        self.assertIs(rai.Transform().kind, kind.IDENTITY)
+        self.assertIs(rai.Transform().move(1, 0).kind, kind.TRANSLATION)
+        self.assertIs(
+            rai.Transform().rotate(rai.quartercircle).move(1, 0).kind,
+            kind.MANHATTAN,
+            )
+        self.assertIs(rai.Transform().hflip().scale(2).kind, kind.MANHATTAN)
+        self.assertIs(rai.Transform().scale(2, 3).kind, kind.GENERAL)
+        self.assertIs(rai.Transform().rotate(0.3).kind, kind.GENERAL)
+
+        # The cached kind follows changes
+        transform = rai.Transform()
+        transform.move(1, 2)
+        transform.rotate(0.3)
+        self.assertIs(transform.kind, kind.GENERAL)
+        transform.rotate(-0.3)
+        transform.reset()
+        self.assertIs(transform.kind, kind.IDENTITY)
+
+    def test_decompose(self):
+        decomposition = (
+            rai.Transform()
+            .vflip()
+            .rotate(rai.quartercircle)
+            .scale(2)
+            .move(3, 4)
+            .decompose()
+            )
+        self.assertEqual(decomposition.magnification, 2)
+        self.assertEqual(decomposition.angle, rai.quartercircle * 3)
+        self.assertTrue(decomposition.mirror)
+        self.assertEqual(decomposition.offset, (3, 4))
+
+        decomposition = rai.Transform().rotate(0.3).scale(1.5).decompose()
+        self.assertAlmostEqual(decomposition.magnification, 1.5)
+        self.assertAlmostEqual(decomposition.angle, 0.3)
+        self.assertFalse(decomposition.mirror)
+
+        self.assertIsNone(rai.Transform().scale(1, 2).decompose())
+
+    def test_kernels(self):
+        poly = np.array([[0, 0], [1, 0], [1, 3], [-2, 5]], dtype=np.float64)
+        transforms = [
+            rai.Transform(),
+            rai.Transform().move(1, 2),
+            rai.Transform().rotate(rai.quartercircle).move(1, 2),
+            rai.Transform().flip().scale(3),
+            rai.Transform().hflip().rotate(rai.halfcircle),
+            rai.Transform().rotate(0.3).move(1, 2),
+            ]
+        for transform in transforms:
+            expected = rai.affine.transform_xyarray(transform._affine, poly)
+            transformed = transform.transform_xyarray(poly)
+            self.assertTrue(np.allclose(transformed, expected))
+            self.assertFalse(np.shares_memory(transformed, poly))
+
+            self.assertEqual(
+                transform.transform_xyarray(poly.astype(np.float32)).dtype,
+                np.float32,
+                )
+
+            grid = (poly * 1000).astype(np.int64)
+            self.assertTrue(np.array_equal(
+                transform.transform_grid(grid, 1e-3),
+                np.rint(expected * 1000),
+                ))
+
+    def test_kernel_out(self):
+        rng = np.random.default_rng(0)
+        # Big enough to be processed in several blocks
+        xyarray = rng.random((rai.affine.BLOCK * 2 + 5, 2))
+        workspace = rai.affine.Workspace()
+
+        for transform in (
+                rai.Transform().move(1, 2),
+                rai.Transform().rotate(rai.quartercircle).move(1, 2),
+                rai.Transform().rotate(0.3).move(1, 2),
+                ):
+            expected = xyarray @ transform._affine[:2, :2].T
+            expected += transform._affine[:2, 2]
+
+            out = np.empty_like(xyarray)
+            result = transform.transform_xyarray(
+                xyarray,
+                out=out,
+                workspace=workspace,
+                )
+            self.assertIs(result, out)
+            self.assertTrue(np.allclose(out, expected))
+
+            # Small arrays take a different path
+            self.assertTrue(np.allclose(
+                transform.transform_xyarray(xyarray[:10]),
+                expected[:10],
+                ))
+
+            # ...unless there's somewhere to write to
+            small = xyarray[:10].copy()
+            result = transform.transform_xyarray(
+                small,
+                out=small,
+                workspace=workspace,
+                )
+            self.assertIs(result, small)
+            self.assertTrue(np.allclose(small, expected[:10]))
+
+            # In-place
+            inplace = xyarray.copy()
+            transform.transform_xyarray(
+                inplace,
+                out=inplace,
+                workspace=workspace,
+                )
+            self.assertTrue(np.allclose(inplace, expected))
+
+    def test_flat_transform(self):
+        inner = Marked().proxy().rotate(rai.quartercircle)
+        outer = inner.proxy().move(5, 0)
+
+        # Outer transform applies after the inner one
+        self.assertTrue(np.allclose(outer.marks.tip, (5, 1)))
+        self.assertTrue(np.allclose(
+            outer.get_flat_transform().transform_point((1, 0)),
+            outer.steamroll()['root'][0][1],
+            ))
+        self.assertTrue(np.allclose(
+            outer.get_flat_inverse().transform_point((5, 1)),
+            (1, 0),
+            ))
+
+        # Changing any transform in the chain invalidates the cache
+        inner.move(0, 2)
+        self.assertTrue(np.allclose(outer.marks.tip, (5, 3)))
+        inner.marks.tip.to((0, 0))
+        self.assertTrue(np.allclose(outer.marks.tip, (5, 0)))
+        outer.rotate(rai.halfcircle)
+        self.assertTrue(np.allclose(outer.marks.tip, (-5, 0)))
+        self.assertTrue(np.allclose(
+            outer.get_flat_inverse().transform_point((-5, 0)),
+            (1, 0),
+            ))
+
+        # Returned transforms are copies
+        outer.get_flat_transform().move(100, 100)
+        self.assertTrue(np.allclose(outer.marks.tip, (-5, 0)))
+
+    def test_flat_lmap(self):
+        inner = Marked().proxy().map({'root': 'a', 'other': 'b'})
+        outer = inner.proxy().map({'a': 'x', 'b': 'y'})
+
+        lmap = outer.get_flat_lmap()
+        self.assertEqual(lmap['root'], 'x')
+        self.assertEqual(lmap['other'], 'y')
+        self.assertEqual(inner.lmap.shorthand, {'root': 'a', 'other': 'b'})
+
+        outer.map('z')
+        self.assertEqual(outer.get_flat_lmap()['root'], 'z')
+
+    def test_compact(self):
+        proxy = BareGeometric().proxy()
+        for obj in (proxy, proxy.lmap, proxy.transform, proxy.bbox):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+        # Copies don't affect each other
+        transform = rai.Transform().move(1, 2)
+        copy = transform.copy().scale(2)
+        self.assertEqual(
+            list(transform.transform_point((0, 0))),
+            [1, 2],
+            )
+        self.assertEqual(
+            list(copy.transform_point((0, 0))),
+            [2, 4],
+            )
+        self.assertEqual(
+            list(rai.Transform().transform_point((1, 1))),
+            [1, 1],
+            )
+
 
 if __name__ == '__main__':
     unittest.main()